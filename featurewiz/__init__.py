@@ -28,6 +28,9 @@ from .my_encoders import TS_Lagging_Transformer, TS_Fourier_Transformer, TS_Tren
 from .my_encoders import TS_Lagging_Transformer_Pipe, TS_Fourier_Transformer_Pipe
 
 from .sulov_method import FE_remove_variables_using_SULOV_method
+from .sulov_method import FE_remove_variables_using_SULOV_method_for_corr_limits
+from .sulov_method import clear_mutual_info_cache
+from .classify_method import profile_columns
 from .featurewiz import FE_transform_numeric_columns_to_bins, FE_create_interaction_vars
 from .stacking_models import Stacking_Classifier, Blending_Regressor, Stacking_Regressor, stacking_models_list
 from .featurewiz import EDA_binning_numeric_column_displaying_bins
@@ -18,6 +18,14 @@ import pdb
 from functools import reduce
 import copy
 import time
+import os
+import pickle
+import tempfile
+import hashlib
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    from pandas._libs.tslibs.parsing import guess_datetime_format
 #################################################################################
 def left_subtract(l1,l2):
     lst = []
@@ -51,7 +59,416 @@ def EDA_find_remove_columns_with_infinity(df, remove=False):
         ## this will be an empty list if there are no columns with infinity
         return add_cols
 ####################################################################################
-def classify_columns(df_preds, verbose=0):
+def find_date_format(ser, sample_rows=100):
+    """
+    Infers an explicit date time format from a small sample of a column. Integers and strings
+    that look like years get '%Y'. Otherwise pandas guesses a format from a few sample values and
+    the first guess that parses the whole sample is returned. Returns None if no format fits.
+    """
+    sample = ser.dropna()
+    if len(sample) > sample_rows:
+        sample = sample.sample(sample_rows, random_state=99)
+    if len(sample) == 0:
+        return None
+    values = sample.astype(str)
+    if values.str.fullmatch(r'\d{4}').all():
+        guesses = ['%Y']
+    else:
+        guesses = []
+        for value in values.values[:10]:
+            guess = guess_datetime_format(value)
+            if guess is not None and guess not in guesses:
+                guesses.append(guess)
+    for date_format in guesses:
+        try:
+            pd.to_datetime(values, format=date_format)
+            return date_format
+        except (ValueError, TypeError):
+            pass
+    return None
+####################################################################################
+def convert_to_datetime(ser, date_format=None):
+    """
+    Converts a column to date time in one vectorized call using an explicit format if one is
+    given. If the format does not fit all the values, pandas infers the format as before.
+    """
+    if date_format:
+        try:
+            return pd.to_datetime(ser, format=date_format)
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(ser, infer_datetime_format=True)
+####################################################################################
+def find_string_lengths(ser):
+    """
+    Returns the length of each value of an object column after its missing values are filled
+    with '  ' (two spaces). Values that are not strings get a length of zero.
+    """
+    notnull = ser.notnull().values
+    if pd.api.types.infer_dtype(ser, skipna=True) == 'string':
+        lengths = ser.str.len().values
+    else:
+        lengths = np.array([len(x) if type(x)==str else 0 for x in ser.values], dtype=float)
+    return np.where(notnull, lengths, 2)
+####################################################################################
+def find_column_profile(ser, top_n=3):
+    """
+    Returns a dictionary with the profile of one column (a pandas Series). See profile_columns.
+    """
+    value_counts = ser.value_counts()
+    nunique = len(value_counts)
+    null_count = ser.isnull().sum()
+    row = {'dtype': ser.dtype, 'nunique': nunique, 'nunique_filled': nunique,
+            'null_count': null_count, 'top_values': value_counts.index[:top_n].tolist(),
+            'type_mix': int(null_count < len(ser)), 'max_str_len': np.nan, 'mean_str_len': np.nan,
+            'min': np.nan, 'max': np.nan, 'inf_count': 0, 'date_probe': None, 'date_format': None}
+    if ser.dtype == object:
+        ### the filled value '  ' adds one more unique value only if it is not there already ###
+        if null_count > 0 and '  ' not in value_counts.index:
+            row['nunique_filled'] = nunique + 1
+        if pd.api.types.infer_dtype(ser, skipna=True) != 'string':
+            row['type_mix'] = len(set(map(type, ser.dropna().values)))
+        lengths = find_string_lengths(ser)
+        if len(lengths) > 0:
+            row['max_str_len'] = lengths.max()
+            row['mean_str_len'] = lengths.mean()
+    elif str(ser.dtype) == 'category':
+        row['type_mix'] = len(ser.dropna().apply(type).value_counts())
+    elif pd.api.types.is_numeric_dtype(ser) and not pd.api.types.is_bool_dtype(ser):
+        ### nullable dtypes return pd.NA for empty columns: it is stored as NaN ###
+        col_min, col_max = ser.min(), ser.max()
+        row['min'] = np.nan if pd.isnull(col_min) else col_min
+        row['max'] = np.nan if pd.isnull(col_max) else col_max
+        if pd.api.types.is_float_dtype(ser):
+            row['inf_count'] = int(np.isinf(ser).sum())
+        ### integers in the range of years may be date time vars: check if pandas can convert them ###
+        ### The format is inferred on a small sample and then applied to the column only once ###
+        if str(ser.dtype) in ['uint8','uint16','uint32','uint64','int8','int16','int32','int64'
+                ] and nunique != 2 and not (row['min'] < 1900 or row['max'] > 2050):
+            row['date_format'] = find_date_format(ser)
+            try:
+                convert_to_datetime(ser, row['date_format'])
+                row['date_probe'] = True
+            except:
+                row['date_probe'] = False
+    return row
+####################################################################################
+def find_profile_of_columns(columns, top_n=3):
+    """
+    Profiles a list of columns (pandas Series). This is the work done by each worker process.
+    """
+    return [find_column_profile(ser, top_n) for ser in columns]
+####################################################################################
+def profile_columns(df, top_n=3, n_jobs=1):
+    """
+    This profiles every column of a dataframe in one pass so that no column statistic has to be
+    computed twice. It counts the values of each column only once. The classification rules in
+    classify_columns read all their statistics from this profile.
+
+    Inputs:
+    df: pandas dataframe
+    top_n: number of most frequent values to keep for each column
+    n_jobs: number of worker processes to shard the columns across. -1 means all the cpu's.
+        Numeric column buffers are shared with the workers as memory-maps by joblib instead
+        of being pickled. Object columns hold python objects and have to be pickled.
+
+    Outputs:
+    profile: a dataframe with one row per column of df and the following columns:
+        dtype: dtype of the column
+        nunique: number of unique values not counting missing values
+        nunique_filled: number of unique values after missing values are filled with '  ' (object columns)
+        null_count: number of missing values
+        top_values: list of the top_n most frequent values
+        type_mix: number of different python types among the values that are not missing
+        max_str_len, mean_str_len: string length stats after missing values are filled with '  '
+        min, max: min and max of numeric columns
+        inf_count: number of infinite values in float columns
+        date_probe: for integer columns in the range of years, whether pd.to_datetime can convert them
+        date_format: the date time format inferred on a sample of those integer columns
+    """
+    columns = [df.iloc[:, i] for i in range(df.shape[1])]
+    rows = find_results_in_shards(find_profile_of_columns, columns, n_jobs, top_n)
+    profile = pd.DataFrame(rows, index=df.columns, columns=profile_names)
+    return profile
+####################################################################################
+profile_names = ['dtype','nunique','nunique_filled','null_count','top_values','type_mix',
+                'max_str_len','mean_str_len','min','max','inf_count','date_probe','date_format']
+def find_results_in_shards(function, items, n_jobs, *args):
+    """
+    Splits a list of items (columns) into one shard per worker process and calls function on
+    each shard with args. Returns the flat list of results in the same order as items.
+    """
+    if n_jobs is None:
+        n_jobs = 1
+    if n_jobs != 1 and len(items) > 1:
+        from joblib import Parallel, delayed, effective_n_jobs
+        n_workers = min(effective_n_jobs(n_jobs), len(items))
+        shards = np.array_split(np.arange(len(items)), n_workers)
+        results = Parallel(n_jobs=n_workers, max_nbytes='1M')(delayed(function)(
+                            [items[i] for i in shard], *args) for shard in shards)
+        return [result for shard_results in results for result in shard_results]
+    else:
+        return function(items, *args)
+####################################################################################
+#### A column profile can be saved to disk and updated with only the rows that were appended
+#### since the last run. Counts, null counts, min, max and type votes are kept exactly. The
+#### hashes of the unique values and their counts are kept exactly up to sketch_exact_limit
+#### unique values. After that the number of unique values is estimated with a HyperLogLog
+#### sketch and the counts of the top values are estimated with a count-min sketch. The hashes
+#### of a column are also kept for as long as all its values are unique, so that an ID column
+#### is found exactly and a column with a few duplicates is never taken for an ID column.
+hll_precision = 14
+sketch_exact_limit = 2048
+cms_width_bits = 10
+cms_multipliers = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                            0xD6E8FEB86659FD93], dtype=np.uint64)
+max_sketch_candidates = 10
+def create_column_sketch(ser):
+    """
+    Returns an empty sketch for a column (a pandas Series). See update_column_sketch.
+    """
+    return {'dtype': ser.dtype, 'count': 0, 'null_count': 0,
+            'hashes': np.array([], dtype=np.uint64), 'counts': np.array([], dtype=np.int64),
+            'unique_hashes': np.array([], dtype=np.uint64),
+            'registers': None, 'cms': None, 'candidates': {}, 'has_filler': False,
+            'type_votes': {}, 'max_str_len': np.nan, 'sum_str_len': 0.0, 'min': np.nan,
+            'max': np.nan, 'inf_count': 0, 'date_probe': None, 'date_format': None}
+####################################################################################
+def find_cms_slots(hashes):
+    """
+    Returns the slot of each hash in every row of the count-min sketch.
+    """
+    shift = np.uint64(64 - cms_width_bits)
+    return [((hashes * multiplier) >> shift).astype(np.int64) for multiplier in cms_multipliers]
+####################################################################################
+def add_to_dense_sketches(sketch, hashes, counts):
+    """
+    Adds value hashes and their counts to the HyperLogLog registers and the count-min sketch.
+    """
+    ### HyperLogLog: the first bits of a hash pick a register and the rest give its rank ###
+    rest_bits = 64 - hll_precision
+    register_index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = (hashes & np.uint64((1 << rest_bits) - 1)).astype(float)
+    ranks = rest_bits + 1 - np.frexp(rest)[1]
+    np.maximum.at(sketch['registers'], register_index, ranks.astype(np.uint8))
+    for row, slots in enumerate(find_cms_slots(hashes)):
+        np.add.at(sketch['cms'][row], slots, counts)
+####################################################################################
+def find_hll_count(registers):
+    """
+    Estimates the number of unique values from the registers of a HyperLogLog sketch.
+    Small counts are estimated by linear counting of the empty registers.
+    """
+    m = len(registers)
+    alpha = 0.7213/(1 + 1.079/m)
+    estimate = alpha*m*m/np.sum(np.power(2.0, -registers.astype(float)))
+    zeros = np.sum(registers == 0)
+    if estimate <= 2.5*m and zeros > 0:
+        estimate = m*np.log(m/zeros)
+    return estimate
+####################################################################################
+def find_sketch_nunique(sketch):
+    """
+    Returns the number of unique values in a sketch. It is exact up to sketch_exact_limit values
+    and for columns whose values are all unique. Otherwise it is estimated.
+    """
+    if sketch['hashes'] is not None:
+        return len(sketch['hashes'])
+    if sketch['unique_hashes'] is not None:
+        return len(sketch['unique_hashes'])
+    ### a duplicate value has been seen so there must be fewer unique values than values ###
+    not_null = sketch['count'] - sketch['null_count']
+    return int(min(round(find_hll_count(sketch['registers'])), not_null - 1))
+####################################################################################
+def find_sketch_counts(sketch, hashes):
+    """
+    Returns the counts of the values with these hashes: exact counts while the sketch keeps
+    all the hashes and count-min estimates after that.
+    """
+    if sketch['hashes'] is not None:
+        positions = np.searchsorted(sketch['hashes'], hashes)
+        return sketch['counts'][positions]
+    return np.min([sketch['cms'][row][slots] for row, slots in enumerate(
+                    find_cms_slots(hashes))], axis=0)
+####################################################################################
+def update_column_sketch(ser, sketch=None, rows_seen=0):
+    """
+    Updates the sketch of a column with the rows of ser from rows_seen onwards. The rows before
+    rows_seen must be the same rows that the sketch was built from. If there is no sketch or the
+    dtype of the column has changed, a new sketch is built from all the rows of ser.
+    """
+    if sketch is None or 'unique_hashes' not in sketch or str(sketch['dtype']) != str(ser.dtype):
+        sketch = create_column_sketch(ser)
+        rows_seen = 0
+    elif rows_seen == len(ser):
+        return sketch
+    all_rows = ser
+    ser = ser.iloc[rows_seen:]
+    value_counts = ser.value_counts()
+    null_count = int(ser.isnull().sum())
+    sketch['count'] += len(ser)
+    sketch['null_count'] += null_count
+    hashes = pd.util.hash_pandas_object(value_counts.index, index=False).values
+    counts = value_counts.values.astype(np.int64)
+    if sketch['unique_hashes'] is not None:
+        ### the hashes are dropped as soon as a value is seen twice ###
+        unique_hashes = np.union1d(sketch['unique_hashes'], hashes)
+        if (counts > 1).any() or len(unique_hashes) < len(sketch['unique_hashes']) + len(hashes):
+            sketch['unique_hashes'] = None
+        else:
+            sketch['unique_hashes'] = unique_hashes
+    if sketch['hashes'] is not None:
+        ### the hashes are kept sorted with their exact counts until there are too many ###
+        all_hashes, inverse = np.unique(np.concatenate([sketch['hashes'], hashes]), return_inverse=True)
+        all_counts = np.bincount(inverse, weights=np.concatenate([sketch['counts'], counts]),
+                                 minlength=len(all_hashes)).astype(np.int64)
+        if len(all_hashes) <= sketch_exact_limit:
+            sketch['hashes'], sketch['counts'] = all_hashes, all_counts
+        else:
+            sketch['hashes'], sketch['counts'] = None, None
+            sketch['registers'] = np.zeros(2**hll_precision, dtype=np.uint8)
+            sketch['cms'] = np.zeros((len(cms_multipliers), 2**cms_width_bits), dtype=np.int64)
+            add_to_dense_sketches(sketch, all_hashes, all_counts)
+    else:
+        add_to_dense_sketches(sketch, hashes, counts)
+    ### the top values of every batch are kept as candidates for the top values of the column ###
+    candidates = dict(sketch['candidates'])
+    for value_hash, value in zip(hashes[:max_sketch_candidates],
+                                 value_counts.index[:max_sketch_candidates]):
+        candidates.setdefault(int(value_hash), value)
+    candidate_hashes = np.array(list(candidates), dtype=np.uint64)
+    if len(candidate_hashes) > 0:
+        estimates = find_sketch_counts(sketch, candidate_hashes)
+        keep = candidate_hashes[np.argsort(-estimates, kind='stable')[:max_sketch_candidates]]
+        sketch['candidates'] = {int(value_hash): candidates[int(value_hash)] for value_hash in keep}
+    if ser.dtype == object:
+        sketch['has_filler'] = sketch['has_filler'] or '  ' in value_counts.index
+        if pd.api.types.infer_dtype(ser, skipna=True) == 'string':
+            type_votes = {'str': len(ser) - null_count}
+        else:
+            type_votes = ser.dropna().map(lambda x: type(x).__name__).value_counts().to_dict()
+        lengths = find_string_lengths(ser)
+        if len(lengths) > 0:
+            sketch['max_str_len'] = np.fmax(sketch['max_str_len'], lengths.max())
+            sketch['sum_str_len'] += lengths.sum()
+    elif str(ser.dtype) == 'category':
+        type_votes = ser.dropna().apply(lambda x: type(x).__name__).value_counts().to_dict()
+    else:
+        type_votes = {str(ser.dtype): len(ser) - null_count} if null_count < len(ser) else {}
+    for type_name, votes in type_votes.items():
+        sketch['type_votes'][type_name] = sketch['type_votes'].get(type_name, 0) + votes
+    if pd.api.types.is_numeric_dtype(ser) and not pd.api.types.is_bool_dtype(ser):
+        col_min, col_max = ser.min(), ser.max()
+        if not pd.isnull(col_min):
+            sketch['min'] = col_min if pd.isnull(sketch['min']) else min(sketch['min'], col_min)
+            sketch['max'] = col_max if pd.isnull(sketch['max']) else max(sketch['max'], col_max)
+        if pd.api.types.is_float_dtype(ser):
+            sketch['inf_count'] += int(np.isinf(ser).sum())
+        ### integers in the range of years are probed once on all rows and then on new rows only ###
+        if str(ser.dtype) in ['uint8','uint16','uint32','uint64','int8','int16','int32','int64'
+                ] and find_sketch_nunique(sketch) != 2 and not (sketch['min'] < 1900 or
+                sketch['max'] > 2050):
+            if sketch['date_probe'] is None:
+                ser = all_rows
+                sketch['date_format'] = find_date_format(ser)
+            try:
+                convert_to_datetime(ser, sketch['date_format'])
+                date_probe = True
+            except:
+                date_probe = False
+            sketch['date_probe'] = date_probe if sketch['date_probe'] is None else (
+                                        sketch['date_probe'] and date_probe)
+    return sketch
+####################################################################################
+def find_sketches_of_columns(columns_and_sketches, rows_seen):
+    """
+    Updates the sketches of a list of (column, sketch) pairs. This is the work done by each worker.
+    """
+    return [update_column_sketch(ser, sketch, rows_seen) for ser, sketch in columns_and_sketches]
+####################################################################################
+def find_profile_from_sketch(sketch, top_n=3):
+    """
+    Returns a dictionary with the profile of one column from its sketch. See profile_columns.
+    """
+    nunique = find_sketch_nunique(sketch)
+    row = {'dtype': sketch['dtype'], 'nunique': nunique, 'nunique_filled': nunique,
+            'null_count': sketch['null_count'], 'top_values': list(sketch['candidates'].values())[:top_n],
+            'type_mix': len(sketch['type_votes']), 'max_str_len': sketch['max_str_len'],
+            'mean_str_len': np.nan, 'min': sketch['min'], 'max': sketch['max'],
+            'inf_count': sketch['inf_count'], 'date_probe': sketch['date_probe'],
+            'date_format': sketch['date_format']}
+    if sketch['dtype'] == object:
+        if sketch['null_count'] > 0 and not sketch['has_filler']:
+            row['nunique_filled'] = nunique + 1
+        if sketch['count'] > 0:
+            row['mean_str_len'] = sketch['sum_str_len']/sketch['count']
+    return row
+####################################################################################
+def find_profile_fingerprint(df, columns, rows_seen, source=None):
+    """
+    Returns a hash of the first and the last of the rows_seen rows of df in columns and of the
+    source of df (such as a file name). Missing columns or too few rows give None.
+    """
+    if rows_seen == 0 or rows_seen > df.shape[0] or not set(columns).issubset(df.columns):
+        return None
+    rows = df[columns].iloc[[0, rows_seen-1]]
+    row_hashes = pd.util.hash_pandas_object(rows, index=False).values
+    return hashlib.sha1(row_hashes.tobytes() + str(source).encode()).hexdigest()
+####################################################################################
+def update_column_profile(df, profile_path, top_n=3, n_jobs=1, source=None):
+    """
+    This is the same as profile_columns but it saves the sketches of the columns to profile_path
+    (a pickle file) and on the next run it only reads the rows that were appended since then.
+    It is meant for tables that only grow by appending rows: the first rows of df must be the
+    rows that were profiled before. The saved profile keeps a fingerprint of the first and last
+    profiled rows and of the source. If df has fewer rows than the saved profile or the fingerprint
+    does not match, all columns are profiled again. If a column is new or has changed its dtype,
+    that column is profiled again from all the rows of df.
+
+    Inputs:
+    df: pandas dataframe
+    profile_path: path of the pickle file that holds the sketches. It is created if it does not exist.
+    top_n: number of most frequent values to keep for each column
+    n_jobs: number of worker processes to shard the columns across. -1 means all the cpu's.
+    source: default is None. Where df came from, such as its file name. A profile saved from
+        another source is not used.
+
+    Outputs:
+    profile: a dataframe with the same columns as the one returned by profile_columns.
+        nunique is exact up to sketch_exact_limit unique values and for columns whose values
+        are all unique. Otherwise it is estimated above sketch_exact_limit.
+        top_values are estimated from a count-min sketch.
+    """
+    sketches, rows_seen = {}, 0
+    if os.path.exists(profile_path):
+        with open(profile_path, 'rb') as saved_file:
+            saved = pickle.load(saved_file)
+        sketches, rows_seen = saved['sketches'], saved['rows_seen']
+        if rows_seen > df.shape[0]:
+            print('    Saved profile has %d rows but data has only %d rows. Profiling all rows again...' %(
+                                rows_seen, df.shape[0]))
+            sketches, rows_seen = {}, 0
+        elif saved.get('fingerprint') is None or saved['fingerprint'] != find_profile_fingerprint(df,
+                                        list(sketches), rows_seen, source):
+            print('    Saved profile was made from other rows or another source. Profiling all rows again...')
+            sketches, rows_seen = {}, 0
+        else:
+            print('    Updating saved profile of %d rows with %d new rows...' %(rows_seen, df.shape[0]-rows_seen))
+    columns_and_sketches = [(df.iloc[:, i], sketches.get(col)) for i, col in enumerate(df.columns)]
+    new_sketches = find_results_in_shards(find_sketches_of_columns, columns_and_sketches, n_jobs, rows_seen)
+    ### the file is replaced in one step so that an interrupted run cannot leave half a profile ###
+    profile_dir = os.path.dirname(os.path.abspath(profile_path))
+    fd, temp_path = tempfile.mkstemp(prefix='featurewiz_', suffix='.tmp', dir=profile_dir)
+    with os.fdopen(fd, 'wb') as temp_file:
+        pickle.dump({'rows_seen': df.shape[0], 'sketches': dict(zip(df.columns, new_sketches)),
+                     'fingerprint': find_profile_fingerprint(df, list(df.columns), df.shape[0], source)},
+                    temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, profile_path)
+    rows = [find_profile_from_sketch(sketch, top_n) for sketch in new_sketches]
+    profile = pd.DataFrame(rows, index=df.columns, columns=profile_names)
+    return profile
+####################################################################################
+def classify_columns(df_preds, verbose=0, n_jobs=1, profile_path=None, profile_source=None):
     """
     This actually does Exploratory data analysis - it means this function performs EDA
     ######################################################################################
@@ -61,8 +478,13 @@ def classify_columns(df_preds, verbose=0):
     categorical, date or id column, boolean, nlp, discrete_string and cols to delete...
     ####### Returns a dictionary with 10 kinds of vars like the following: # continuous_vars,int_vars
     # cat_vars,factor_vars, bool_vars,discrete_string_vars,nlp_vars,date_vars,id_vars,cols_delete
+    ####### date_formats holds the date time format found for each date var (if one was found).
+    ####### df_preds is never modified here. Hence it is not copied.
+    ####### n_jobs: number of worker processes that profile the columns. -1 means all the cpu's.
+    ####### profile_path: if given, the profile is saved there and only appended rows are read next time.
+    ####### profile_source: where df_preds came from (such as a file name). It is saved with the profile.
     """
-    train = copy.deepcopy(df_preds)
+    train = df_preds
     #### If there are 30 chars are more in a discrete_string_var, it is then considered an NLP variable
     max_nlp_char_size = 30
     max_cols_to_print = 30
@@ -78,64 +500,68 @@ def classify_columns(df_preds, verbose=0):
         return a+b
     sum_all_cols = dict()
     orig_cols_total = train.shape[1]
+    #### Every column is profiled once. All the rules below read their stats from this profile ####
+    if profile_path:
+        profile = update_column_profile(train, profile_path, n_jobs=n_jobs, source=profile_source)
+    else:
+        profile = profile_columns(train, n_jobs=n_jobs)
     #Types of columns
     cols_delete = []
-    cols_delete = [col for col in list(train) if (len(train[col].value_counts()) == 1
-                                       ) | (train[col].isnull().sum()/len(train) >= 0.90)]
-    inf_cols = EDA_find_remove_columns_with_infinity(train)
-    mixed_cols = [x for x in list(train) if len(train[x].dropna().apply(type).value_counts()) > 1]
+    cols_delete = [col for col in list(train) if (profile.at[col,'nunique'] == 1
+                                       ) | (profile.at[col,'null_count']/len(train) >= 0.90)]
+    inf_counts = profile['inf_count']
+    inf_cols = inf_counts[inf_counts > 0].index.tolist()
+    if len(inf_cols) > 0:
+        print('    there are %d rows and %d columns with infinity in them...' %(inf_counts.sum(),len(inf_cols)))
+    mixed_cols = [x for x in list(train) if profile.at[x,'type_mix'] > 1]
     if len(mixed_cols) > 0:
         print('    Removing %s column(s) due to mixed data type detected...' %mixed_cols)
     cols_delete += mixed_cols
     cols_delete += inf_cols
     train = train[left_subtract(list(train),cols_delete)]
+    ##### The column types are found using boolean masks over the dtypes and the profile ######
     var_df = pd.Series(dict(train.dtypes)).reset_index(drop=False).rename(
                         columns={0:'type_of_column'})
     sum_all_cols['cols_delete'] = cols_delete
-
-    var_df['bool'] = var_df.apply(lambda x: 1 if x['type_of_column'] in ['bool','object']
-                        and len(train[x['index']].value_counts()) == 2 else 0, axis=1)
+    col_profile = profile.loc[var_df['index'].values]
+    type_names = var_df['type_of_column'].astype(str).values
+    nunique = col_profile['nunique'].values
+    nunique_filled = col_profile['nunique_filled'].values
+    max_str_len = col_profile['max_str_len'].values
+    mean_str_len = col_profile['mean_str_len'].values
+    int_types = ['uint8','uint16','uint32','uint64','int8','int16','int32','int64']
+    float_types = ['float16','float32','float64']
+    is_object = type_names == 'object'
+    is_int = np.isin(type_names, int_types)
+    is_float = np.isin(type_names, float_types)
+    ######   Boolean columns have exactly two values ###
+    is_bool = np.isin(type_names, ['bool','object']) & (nunique == 2)
+    var_df['bool'] = is_bool.astype(int)
     string_bool_vars = list(var_df[(var_df['bool'] ==1)]['index'])
     sum_all_cols['string_bool_vars'] = string_bool_vars
-    var_df['num_bool'] = var_df.apply(lambda x: 1 if x['type_of_column'] in [np.uint8,
-                            np.uint16, np.uint32, np.uint64,
-                            'int8','int16','int32','int64',
-                            'float16','float32','float64'] and len(
-                        train[x['index']].value_counts()) == 2 else 0, axis=1)
+    is_num_bool = (is_int | is_float) & (nunique == 2)
+    var_df['num_bool'] = is_num_bool.astype(int)
     num_bool_vars = list(var_df[(var_df['num_bool'] ==1)]['index'])
     sum_all_cols['num_bool_vars'] = num_bool_vars
     ######   This is where we take all Object vars and split them into diff kinds ###
-    discrete_or_nlp = var_df.apply(lambda x: 1 if x['type_of_column'] in ['object']  and x[
-        'index'] not in string_bool_vars+cols_delete else 0,axis=1)
     ######### This is where we figure out whether a string var is nlp or discrete_string var ###
-    var_df['nlp_strings'] = 0
-    var_df['discrete_strings'] = 0
-    var_df['cat'] = 0
-    var_df['id_col'] = 0
-    discrete_or_nlp_vars = var_df.loc[discrete_or_nlp==1]['index'].values.tolist()
-    copy_discrete_or_nlp_vars = copy.deepcopy(discrete_or_nlp_vars)
-    if len(discrete_or_nlp_vars) > 0:
-        for col in copy_discrete_or_nlp_vars:
-            #### first fill empty or missing vals since it will blowup ###
-            ### Remember that fillna only works at the dataframe level!
-            train[[col]] = train[[col]].fillna('  ')
-            if train[col].map(lambda x: len(x) if type(x)==str else 0).max(
-                ) >= 50 and len(train[col].value_counts()
-                        ) >= int(0.9*len(train)) and col not in string_bool_vars:
-                var_df.loc[var_df['index']==col,'nlp_strings'] = 1
-            elif train[col].map(lambda x: len(x) if type(x)==str else 0).mean(
-                ) >= max_nlp_char_size and train[col].map(lambda x: len(x) if type(x)==str else 0).max(
-                ) < 50 and len(train[col].value_counts()
-                        ) <= int(0.9*len(train)) and col not in string_bool_vars:
-                var_df.loc[var_df['index']==col,'discrete_strings'] = 1
-            elif len(train[col].value_counts()) > cat_limit and len(train[col].value_counts()
-                        ) <= int(0.9*len(train)) and col not in string_bool_vars:
-                var_df.loc[var_df['index']==col,'discrete_strings'] = 1
-            elif len(train[col].value_counts()) > cat_limit and len(train[col].value_counts()
-                        ) == len(train) and col not in string_bool_vars:
-                var_df.loc[var_df['index']==col,'id_col'] = 1
-            else:
-                var_df.loc[var_df['index']==col,'cat'] = 1
+    ######### The string stats in the profile are found after empty or missing vals are filled ###
+    discrete_or_nlp = is_object & ~is_bool
+    nlp_limit = int(0.9*len(train))
+    with np.errstate(invalid='ignore'):
+        is_nlp = discrete_or_nlp & (max_str_len >= 50) & (nunique_filled >= nlp_limit)
+        rest = discrete_or_nlp & ~is_nlp
+        is_discrete = rest & (mean_str_len >= max_nlp_char_size) & (max_str_len < 50) & (
+                                nunique_filled <= nlp_limit)
+        rest = rest & ~is_discrete
+        is_discrete_many = rest & (nunique_filled > cat_limit) & (nunique_filled <= nlp_limit)
+        rest = rest & ~is_discrete_many
+        is_string_id = rest & (nunique_filled > cat_limit) & (nunique_filled == len(train))
+        is_string_cat = rest & ~is_string_id
+    var_df['nlp_strings'] = is_nlp.astype(int)
+    var_df['discrete_strings'] = (is_discrete | is_discrete_many).astype(int)
+    var_df['cat'] = is_string_cat.astype(int)
+    var_df['id_col'] = is_string_id.astype(int)
     nlp_vars = list(var_df[(var_df['nlp_strings'] ==1)]['index'])
     sum_all_cols['nlp_vars'] = nlp_vars
     discrete_string_vars = list(var_df[(var_df['discrete_strings'] ==1) ]['index'])
@@ -143,56 +569,47 @@ def classify_columns(df_preds, verbose=0):
     ###### This happens only if a string column happens to be an ID column #######
     #### DO NOT Add this to ID_VARS yet. It will be done later.. Dont change it easily...
     #### Category DTYPE vars are very special = they can be left as is and not disturbed in Python. ###
-    var_df['dcat'] = var_df.apply(lambda x: 1 if str(x['type_of_column'])=='category' else 0,
-                            axis=1)
+    var_df['dcat'] = (type_names == 'category').astype(int)
     factor_vars = list(var_df[(var_df['dcat'] ==1)]['index'])
     sum_all_cols['factor_vars'] = factor_vars
     ########################################################################
-    date_or_id = var_df.apply(lambda x: 1 if x['type_of_column'] in [np.uint8,
-                         np.uint16, np.uint32, np.uint64,
-                         'int8','int16',
-                        'int32','int64']  and x[
-        'index'] not in string_bool_vars+num_bool_vars+discrete_string_vars+nlp_vars else 0,
-                                        axis=1)
+    ### string bools, discrete strings and nlp vars are never integers: so only num bools are excluded here ###
+    date_or_id = is_int & ~is_num_bool
     ######### This is where we figure out whether a numeric col is date or id variable ###
-    var_df['int'] = 0
-    var_df['date_time'] = 0
     ### if a particular column is date-time type, now set it as a date time variable ##
-    var_df['date_time'] = var_df.apply(lambda x: 1 if x['type_of_column'] in ['<M8[ns]','datetime64[ns]']  and x[
-        'index'] not in string_bool_vars+num_bool_vars+discrete_string_vars+nlp_vars else 0,
-                                        axis=1)
-    ### this is where we save them as date time variables ###
-    if len(var_df.loc[date_or_id==1]) != 0:
-        for col in var_df.loc[date_or_id==1]['index'].values.tolist():
-            if len(train[col].value_counts()) == len(train):
-                if train[col].min() < 1900 or train[col].max() > 2050:
-                    var_df.loc[var_df['index']==col,'id_col'] = 1
-                else:
-                    try:
-                        pd.to_datetime(train[col],infer_datetime_format=True)
-                        var_df.loc[var_df['index']==col,'date_time'] = 1
-                    except:
-                        var_df.loc[var_df['index']==col,'id_col'] = 1
+    is_date = np.isin(type_names, ['<M8[ns]','datetime64[ns]'])
+    with np.errstate(invalid='ignore'):
+        out_of_range = (col_profile['min'].values < 1900) | (col_profile['max'].values > 2050)
+    all_unique = nunique == len(train)
+    is_id = is_string_id | (date_or_id & all_unique & out_of_range)
+    is_int_var = date_or_id & ~all_unique & out_of_range
+    ### integers in the range of years are date time variables if pandas can convert them ###
+    probed_date_vars = []
+    for position in np.flatnonzero(date_or_id & ~out_of_range):
+        col = var_df['index'].values[position]
+        if col_profile['date_probe'].values[position]:
+            is_date[position] = True
+            probed_date_vars.append(col)
+        else:
+            if all_unique[position]:
+                is_id[position] = True
             else:
-                if train[col].min() < 1900 or train[col].max() > 2050:
-                    if col not in num_bool_vars:
-                        var_df.loc[var_df['index']==col,'int'] = 1
-                else:
-                    try:
-                        pd.to_datetime(train[col],infer_datetime_format=True)
-                        var_df.loc[var_df['index']==col,'date_time'] = 1
-                    except:
-                        if col not in num_bool_vars:
-                            var_df.loc[var_df['index']==col,'int'] = 1
-    else:
-        pass
+                is_int_var[position] = True
+    var_df['id_col'] = is_id.astype(int)
+    var_df['int'] = is_int_var.astype(int)
+    var_df['date_time'] = is_date.astype(int)
     int_vars = list(var_df[(var_df['int'] ==1)]['index'])
     date_vars = list(var_df[(var_df['date_time'] == 1)]['index'])
     id_vars = list(var_df[(var_df['id_col'] == 1)]['index'])
     sum_all_cols['int_vars'] = int_vars
     copy_date_vars = copy.deepcopy(date_vars)
+    date_formats = {}
     for date_var in copy_date_vars:
         #### This test is to make sure sure date vars are actually date vars
+        if date_var in probed_date_vars:
+            ### these were converted to date time above already ###
+            date_formats[date_var] = profile.at[date_var,'date_format']
+            continue
         try:
             pd.to_datetime(train[date_var],infer_datetime_format=True)
         except:
@@ -200,34 +617,29 @@ def classify_columns(df_preds, verbose=0):
             cols_delete.append(date_var)
             date_vars.remove(date_var)
     sum_all_cols['date_vars'] = date_vars
+    ### the formats of date vars are returned so that they are not inferred again in conversion ###
+    sum_all_cols['date_formats'] = dict([(date_var, date_formats[date_var]) for date_var in date_vars
+                                        if date_formats.get(date_var)])
     sum_all_cols['id_vars'] = id_vars
     sum_all_cols['cols_delete'] = cols_delete
     ## This is an EXTREMELY complicated logic for cat vars. Don't change it unless you test it many times!
-    var_df['numeric'] = 0
-    float_or_cat = var_df.apply(lambda x: 1 if x['type_of_column'] in ['float16',
-                            'float32','float64'] else 0,
-                                        axis=1)
     #######  We need to make sure there are no categorical vars in float #######
-    if len(var_df.loc[float_or_cat == 1]) > 0:
-        for col in var_df.loc[float_or_cat == 1]['index'].values.tolist():
-            if len(train[col].value_counts()) > 2 and len(train[col].value_counts()
-                ) <= float_limit and len(train[col].value_counts()) <= len(train):
-                var_df.loc[var_df['index']==col,'cat'] = 1
-            else:
-                if col not in (num_bool_vars + factor_vars):
-                    var_df.loc[var_df['index']==col,'numeric'] = 1
+    is_float_cat = is_float & (nunique > 2) & (nunique <= float_limit) & (nunique <= len(train))
+    var_df['cat'] = (is_string_cat | is_float_cat).astype(int)
+    ### factor vars are never floats: so only num bools are excluded here ###
+    var_df['numeric'] = (is_float & ~is_float_cat & ~is_num_bool).astype(int)
     cat_vars = list(var_df[(var_df['cat'] ==1)]['index'])
     continuous_vars = list(var_df[(var_df['numeric'] ==1)]['index'])
     
     ########  V E R Y    I M P O R T A N T   ###################################################
     cat_vars_copy = copy.deepcopy(factor_vars) 
     for cat in cat_vars_copy:
-        if df_preds[cat].dtype==float:
+        if profile.at[cat,'dtype']==float:
             continuous_vars.append(cat)
             factor_vars.remove(cat)
             var_df.loc[var_df['index']==cat,'dcat'] = 0
             var_df.loc[var_df['index']==cat,'numeric'] = 1
-        elif len(df_preds[cat].value_counts()) == df_preds.shape[0]:
+        elif profile.at[cat,'nunique'] == df_preds.shape[0]:
             id_vars.append(cat)
             factor_vars.remove(cat)
             var_df.loc[var_df['index']==cat,'dcat'] = 0
@@ -237,12 +649,12 @@ def classify_columns(df_preds, verbose=0):
     ##### There are a couple of extra tests you need to do to remove abberations in cat_vars ###
     cat_vars_copy = copy.deepcopy(cat_vars) 
     for cat in cat_vars_copy:
-        if df_preds[cat].dtype==float:
+        if profile.at[cat,'dtype']==float:
             continuous_vars.append(cat)
             cat_vars.remove(cat)
             var_df.loc[var_df['index']==cat,'cat'] = 0
             var_df.loc[var_df['index']==cat,'numeric'] = 1
-        elif len(df_preds[cat].value_counts()) == df_preds.shape[0]:
+        elif profile.at[cat,'nunique'] == df_preds.shape[0]:
             id_vars.append(cat)
             cat_vars.remove(cat)
             var_df.loc[var_df['index']==cat,'cat'] = 0
@@ -254,18 +666,18 @@ def classify_columns(df_preds, verbose=0):
     var_dict_sum = dict(zip(var_df.values[:,0], var_df.values[:,2:].sum(1)))
     for col, sumval in var_dict_sum.items():
         if sumval == 0:
-            print('%s of type=%s is not classified' %(col,train[col].dtype))
+            print('%s of type=%s is not classified' %(col,profile.at[col,'dtype']))
         elif sumval > 1:
-            print('%s of type=%s is classified into more then one type' %(col,train[col].dtype))
+            print('%s of type=%s is classified into more then one type' %(col,profile.at[col,'dtype']))
         else:
             pass
     ##### If there are more than 1000 unique values, then add it to NLP vars ###
     copy_discretes = copy.deepcopy(discrete_string_vars)
     for each_discrete in copy_discretes:
-        if train[each_discrete].nunique() >= 1000:
+        if profile.at[each_discrete,'nunique_filled'] >= 1000:
             nlp_vars.append(each_discrete)
             discrete_string_vars.remove(each_discrete)
-        elif train[each_discrete].nunique() > 100 and train[each_discrete].nunique() < 1000:
+        elif profile.at[each_discrete,'nunique_filled'] > 100 and profile.at[each_discrete,'nunique_filled'] < 1000:
             pass
         else:
             ### If it is less than 100 unique values, then make it categorical var
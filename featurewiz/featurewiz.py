@@ -40,6 +40,9 @@ from sklearn.preprocessing import LabelEncoder
 from category_encoders.wrapper import PolynomialWrapper
 from .encoders import FrequencyEncoder
 from .sulov_method import FE_remove_variables_using_SULOV_method
+from .sulov_method import create_numeric_working_set, delete_numeric_working_set
+from .sulov_method import remove_highly_correlated_vars_fast
+from .sulov_method import find_row_chunks, find_correlated_pairs_from_chunks
 from .classify_method import classify_columns, EDA_find_remove_columns_with_infinity
 from .ml_models import analyze_problem_type, get_sample_weight_array, check_if_GPU_exists
 from .my_encoders import Groupby_Aggregator, My_LabelEncoder_Pipe, My_LabelEncoder
@@ -82,17 +85,18 @@ import xgboost
 from dask.distributed import Client, progress
 import psutil
 import json
+import os
 from sklearn.model_selection import train_test_split
 from .my_encoders import FE_convert_all_object_columns_to_numeric
 #######################################################################################################
-def classify_features(dfte, depVar, verbose=0):
-    dfte = copy.deepcopy(dfte)
+def classify_features(dfte, depVar, verbose=0, n_jobs=1, profile_path=None, profile_source=None):
     if isinstance(depVar, list):
         orig_preds = [x for x in list(dfte) if x not in depVar]
     else:
         orig_preds = [x for x in list(dfte) if x not in [depVar]]
     #################    CLASSIFY  COLUMNS   HERE    ######################
-    var_df = classify_columns(dfte[orig_preds], verbose)
+    var_df = classify_columns(dfte[orig_preds], verbose, n_jobs=n_jobs, profile_path=profile_path,
+                              profile_source=profile_source)
     #####       Classify Columns   ################
     IDcols = var_df['id_vars']
     discrete_string_vars = var_df['nlp_vars']+var_df['discrete_string_vars']
@@ -101,6 +105,7 @@ def classify_features(dfte, depVar, verbose=0):
     int_vars = var_df['int_vars']
     categorical_vars = var_df['cat_vars'] + var_df['factor_vars'] + int_vars + bool_vars
     date_vars = var_df['date_vars']
+    date_formats = var_df['date_formats']
     if len(var_df['continuous_vars'])==0 and len(int_vars)>0:
         continuous_vars = var_df['int_vars']
         categorical_vars = left_subtract(categorical_vars, int_vars)
@@ -143,7 +148,7 @@ def classify_features(dfte, depVar, verbose=0):
     features_dict = dict([('IDcols',IDcols),('cols_delete',cols_delete),('bool_vars',bool_vars),(
                             'categorical_vars',categorical_vars),
                         ('continuous_vars',continuous_vars),('discrete_string_vars',discrete_string_vars),
-                        ('date_vars',date_vars)])
+                        ('date_vars',date_vars),('date_formats',date_formats)])
     return features_dict
 #######################################################################################################
 def marthas_columns(data,verbose=0):
@@ -179,12 +184,275 @@ import time
 from sklearn.feature_selection import chi2, mutual_info_regression, mutual_info_classif
 from sklearn.feature_selection import SelectKBest
 ##################################################################################
-def load_file_dataframe(dataname, sep=",", header=0, verbose=0, 
-                    nrows=None, parse_dates=False, target='', is_test_flag=False):
+def sniff_csv_file(filename, sep=",", header=0, parse_dates=False, sample_rows=10000,
+                    encodings=None):
+    """
+    This reads only a small sample of rows from a csv file to find an encoding that works
+    and the data types of each column. Only the sample is parsed for each encoding that is
+    tried, never the whole file. This way a huge file is not re-read once for every encoding.
+    Inputs:
+        filename: name of the csv file with full path
+        sample_rows: number of rows to read for sniffing the encoding and data types
+        encodings: list of encodings to try in that order. None means pandas default first.
+    Outputs:
+        encoding: the encoding that worked on the sample. It will be '' if nothing worked.
+        dtypes: dictionary of column name and dtype to use while reading the rest of the file.
+            Only object and float columns are pinned down. Integer columns are left out since
+            they can turn into floats later in the file if there are missing values.
+        sample: the sample dataframe that was read. It will be None if nothing worked.
+    """
+    if encodings is None:
+        encodings = [None, 'ascii', 'utf-8', 'iso-8859-1', 'cp1252', 'latin1']
+    sample = None
+    encoding = ''
+    for code in encodings:
+        try:
+            sample = pd.read_csv(filename, sep=sep, header=header, encoding=code,
+                            nrows=sample_rows, parse_dates=parse_dates)
+            encoding = code
+            break
+        except:
+            continue
+    if sample is None:
+        return '', {}, None
+    dtypes = {}
+    for col, col_type in sample.dtypes.items():
+        if col_type == object:
+            dtypes[col] = object
+        elif str(col_type).startswith('float'):
+            dtypes[col] = np.float64
+    return encoding, dtypes, sample
+##################################################################################
+def downcast_integer_columns(df, skip_cols=[]):
+    """
+    This downcasts all integer columns in a dataframe to the smallest integer type that fits.
+    This is lossless unlike floats. Columns in skip_cols (such as the target) are left alone
+    since downcasting a target may change how its model type is detected.
+    """
+    int_cols = df.select_dtypes(include='integer').columns.tolist()
+    int_cols = left_subtract(int_cols, skip_cols)
+    for col in int_cols:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+##################################################################################
+def sample_rows_from_chunks(chunks, nrows, target, modeltype, random_state=99):
+    """
+    This samples nrows rows from an iterator of dataframe chunks in a single pass. This way
+    you never have to load the whole file into memory just to keep a few rows of it.
+    For Regression, it keeps the first nrows rows and stops reading after that.
+    For Classification, it keeps a stratified reservoir for each target class: every row gets
+    a random key and each class keeps only its rows with the nrows smallest keys. At the end,
+    each class gets a share of nrows in proportion to its count in the whole file. This gives
+    a stratified random sample just like train_test_split(stratify=...) on the full data.
+    Memory is at most nrows rows per class plus one chunk, no matter how big the file is.
+    """
+    if modeltype == 'Regression':
+        kept = []
+        nkept = 0
+        for chunk in chunks:
+            kept.append(chunk[:nrows-nkept])
+            nkept += len(kept[-1])
+            if nkept >= nrows:
+                break
+        print('        sequentially selected %s max_rows from dataset...' %nkept)
+        return pd.concat(kept, axis=0)
+    if isinstance(target, str):
+        targets = [target]
+    else:
+        targets = copy.deepcopy(target)
+    rng = np.random.RandomState(random_state)
+    key_col = '__featurewiz_sample_key__'
+    reservoir = None
+    class_counts = None
+    for chunk in chunks:
+        chunk[key_col] = rng.random_sample(len(chunk))
+        counts = chunk.groupby(targets).size()
+        if class_counts is None:
+            class_counts = counts
+        else:
+            class_counts = class_counts.add(counts, fill_value=0)
+        if reservoir is not None:
+            chunk = pd.concat([reservoir, chunk], axis=0)
+        ### keep only the nrows rows with smallest keys in each class ####
+        reservoir = chunk.sort_values(key_col).groupby(targets).head(nrows)
+    #### Now split nrows among classes in proportion to their counts in the file ###
+    total_rows = class_counts.sum()
+    quotas = class_counts * min(nrows, total_rows) / total_rows
+    class_quotas = np.floor(quotas)
+    leftover = int(min(nrows, total_rows) - class_quotas.sum())
+    class_quotas[(quotas - class_quotas).sort_values(ascending=False).index[:leftover]] += 1
+    if len(targets) == 1:
+        row_classes = reservoir[targets[0]]
+    else:
+        row_classes = pd.MultiIndex.from_frame(reservoir[targets])
+    row_quotas = class_quotas.reindex(row_classes).values
+    row_ranks = reservoir.groupby(targets).cumcount().values
+    dfte = reservoir[row_ranks < row_quotas].drop(key_col, axis=1).sort_index()
+    print('        stratified sampled %d rows from given %d' %(dfte.shape[0], total_rows))
+    return dfte
+##################################################################################
+def load_csv_file_in_chunks(filename, sep=",", header=0, parse_dates=False, chunksize=None,
+                    target='', sample_rows=10000, verbose=0, nrows=None, modeltype=''):
+    """
+    This is a streaming loader for huge csv files. It sniffs the encoding and dtypes once from
+    a small sample of rows and then reads the file in chunks using those dtypes. Each chunk
+    has its integer columns downcast before the next chunk is read. This means peak memory
+    is roughly one raw chunk plus the compacted result instead of the whole raw dataframe.
+    If chunksize is None, the whole file is read in one go with the sniffed encoding and dtypes.
+    If nrows is given, the rows are sampled while streaming the file (see sample_rows_from_chunks)
+    so that only O(nrows) rows are ever held in memory. The modeltype is found from the sample
+    if it is not given. If a later part of the file does not fit the sniffed encoding or dtypes,
+    it falls back to the next encoding or to letting pandas infer the dtypes by itself.
+    Returns a pandas dataframe or None if the file could not be loaded.
+    """
+    encoding, dtypes, sample = sniff_csv_file(filename, sep=sep, header=header,
+                            parse_dates=parse_dates, sample_rows=sample_rows)
+    if encoding == '':
+        return None
+    if isinstance(target, str):
+        targets = [target]
+    else:
+        targets = copy.deepcopy(target)
+    if nrows is not None and modeltype == '':
+        modeltype, _ = analyze_problem_type(sample[target], target)
+    del sample
+    encodings = [encoding] + [x for x in [None, 'ascii', 'utf-8', 'iso-8859-1', 'cp1252', 'latin1'] if x != encoding]
+    for code in encodings:
+        for each_dtypes in [dtypes, None]:
+            try:
+                if chunksize is None and nrows is None:
+                    return pd.read_csv(filename, sep=sep, header=header, encoding=code,
+                                    dtype=each_dtypes, parse_dates=parse_dates)
+                if chunksize is None:
+                    ### a sample of rows must be streamed even if no chunksize is given ###
+                    reader = pd.read_csv(filename, sep=sep, header=header, encoding=code,
+                            dtype=each_dtypes, parse_dates=parse_dates, chunksize=100000)
+                else:
+                    reader = pd.read_csv(filename, sep=sep, header=header, encoding=code,
+                            dtype=each_dtypes, parse_dates=parse_dates, chunksize=chunksize)
+                    reader = (downcast_integer_columns(chunk, targets) for chunk in reader)
+                if nrows is not None:
+                    return sample_rows_from_chunks(reader, nrows, target, modeltype)
+                chunks = list(reader)
+                if verbose:
+                    print('    Loaded %d chunks of %d rows each using %s encoding' %(
+                                    len(chunks), chunksize, code))
+                return pd.concat(chunks, axis=0)
+            except UnicodeDecodeError:
+                ### the sniffed encoding does not work on the rest of the file. Try next one.
+                break
+            except (ValueError, TypeError):
+                ### the sniffed dtypes do not work on the rest of the file. Let pandas infer them.
+                if each_dtypes is None:
+                    break
+                continue
+    return None
+##################################################################################
+def is_parquet_file(dataname):
+    """
+    Returns True if dataname is the name of a parquet file or a directory holding a parquet dataset.
+    """
+    return dataname.endswith(('.parquet', '.pq', '.parq')) or os.path.isdir(dataname)
+##################################################################################
+def convert_parquet_filters(filters):
+    """
+    Converts a row filter in pyarrow's DNF format such as [('year', '>=', 2020)] into a
+    pyarrow.dataset expression. Expressions and None are returned as they are.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    if hasattr(pq, 'filters_to_expression'):
+        return pq.filters_to_expression(filters)
+    return pq._filters_to_expression(filters)
+##################################################################################
+def load_parquet_dataframe(dataname, columns=None, filters=None, nrows=None, target='',
+                    modeltype='', sample_rows=10000):
+    """
+    This loads a parquet file or a dataset (a directory of parquet files) using pyarrow.
+    Inputs:
+        columns: list of columns to read. Only these columns are read from disk (column projection).
+            Columns that are not in the file (such as the target in test data) are skipped.
+        filters: a row filter that is pushed down to pyarrow so that row groups that do not
+            match are never read. Give it in pyarrow's DNF format such as [('year', '>=', 2020)]
+            or as a pyarrow.dataset expression.
+        nrows: number of rows to sample. Record batches are streamed through the same one-pass
+            sampler used for csv files (see sample_rows_from_chunks). The modeltype is found
+            from the first few rows of the target if it is not given.
+    Outputs:
+        a pandas dataframe
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(dataname, format='parquet', partitioning='hive')
+    if columns is not None:
+        columns = [x for x in columns if x in dataset.schema.names]
+    filters = convert_parquet_filters(filters)
+    if nrows is None:
+        return dataset.to_table(columns=columns, filter=filters).to_pandas()
+    if modeltype == '':
+        modeltype, _ = analyze_problem_type(dataset.head(sample_rows, columns=[target],
+                            filter=filters).to_pandas()[target], target)
+    def stream_batches():
+        ### every batch gets its own row numbers so that sampled rows keep file order ###
+        row_start = 0
+        for batch in dataset.to_batches(columns=columns, filter=filters):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(row_start, row_start+len(chunk))
+            row_start += len(chunk)
+            yield chunk
+    return sample_rows_from_chunks(stream_batches(), nrows, target, modeltype)
+##################################################################################
+def find_parquet_columns_to_load(dataname, target, columns=None, filters=None, sample_rows=10000,
+                                random_state=99):
+    """
+    This classifies the columns of a parquet file or dataset using a random sample of its rows.
+    The sample is taken by row positions across all fragments (after your filters), so that it
+    is not biased towards the first file or row group the way the first few rows would be.
+    It returns the columns that featurewiz needs: the target plus all predictors except the
+    low-information and discrete string variables that featurewiz would drop anyway right after
+    classifying them. This way those columns are never read from disk in the full load.
+    featurewiz turns object columns into category when it reduces memory. So a column is left out
+    only if it is dropped both as it is and as a category column.
+    If you give a list of columns (candidate predictors), only those are considered.
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(dataname, format='parquet', partitioning='hive')
+    if columns is None:
+        columns = dataset.schema.names
+    if isinstance(target, str):
+        targets = [target]
+    else:
+        targets = copy.deepcopy(target)
+    columns = [x for x in columns if x in dataset.schema.names and x not in targets] + targets
+    filters = convert_parquet_filters(filters)
+    n_rows = dataset.count_rows(filter=filters)
+    if n_rows > sample_rows:
+        rng = np.random.RandomState(random_state)
+        sample_index = np.sort(rng.choice(n_rows, sample_rows, replace=False))
+        sample = dataset.take(sample_index, columns=columns, filter=filters).to_pandas()
+    else:
+        sample = dataset.to_table(columns=columns, filter=filters).to_pandas()
+    features_dict = classify_features(sample, target)
+    remove_cols = features_dict['discrete_string_vars'] + features_dict['cols_delete']
+    obj_cols = [x for x in sample.select_dtypes(include='object').columns if x not in targets]
+    if len(set(remove_cols) & set(obj_cols)) > 0:
+        features_dict = classify_features(sample.astype(dict([(x, 'category') for x in obj_cols])), target)
+        remove_cols = [x for x in remove_cols if x in features_dict['discrete_string_vars'] +
+                                                    features_dict['cols_delete']]
+    return left_subtract(columns, remove_cols)
+##################################################################################
+def load_file_dataframe(dataname, sep=",", header=0, verbose=0,
+                    nrows=None, parse_dates=False, target='', is_test_flag=False,
+                    chunksize=None, make_copy=True):
     start_time = time.time()
     ### This is where you have to make sure target is not empty #####
     if not isinstance(dataname,str):
-        dfte = copy.deepcopy(dataname)
+        ### make_copy=False means the caller owns dataname and has copied it already ###
+        if make_copy:
+            dfte = copy.deepcopy(dataname)
+        else:
+            dfte = dataname
         if isinstance(target, str):
             if not is_test_flag:
                 if len(target) == 0:
@@ -214,30 +482,35 @@ def load_file_dataframe(dataname, sep=",", header=0, verbose=0,
             print('    No file given. Continuing...')
             return None
         #### this means they have given file name as a string to load the file #####
-        codex = ['ascii', 'utf-8', 'iso-8859-1', 'cp1252', 'latin1']
         ## this is the total number of rows in df  ###
         ###############################################################################
         if dataname != '' and dataname.endswith(('csv')):
+            ### The encoding and dtypes are sniffed from a small sample so that the ########
+            ###   entire file is parsed only once. Set chunksize to stream huge files. #####
             try:
-                ### You can read the entire data into pandas first and then stratify split it ##
-                ###   If you don't stratify it, then you will have less classes than 2 error ###
-                dfte = pd.read_csv(dataname, sep=sep, header=header, encoding=None, 
-                                parse_dates=parse_dates)
-                print('    pandas default encoder does not work for this file. Trying other encoders...')
+                if is_test_flag:
+                    dfte = load_csv_file_in_chunks(dataname, sep=sep, header=header,
+                                parse_dates=parse_dates, chunksize=chunksize,
+                                target=target, verbose=verbose)
+                else:
+                    ### nrows are sampled while streaming so the full file is never in memory ###
+                    dfte = load_csv_file_in_chunks(dataname, sep=sep, header=header,
+                                parse_dates=parse_dates, chunksize=chunksize,
+                                target=target, verbose=verbose, nrows=nrows)
             except:
-                for code in codex:
-                    try:
-                        dfte = pd.read_csv(dataname, sep=sep, header=header, 
-                                        encoding=code, parse_dates=parse_dates)
-                        break
-                    except:
-                        continue
+                dfte = None
             ######### If the file is not loadable, then give an error message #########
-            try:
-                print('    Shape of your Data Set loaded: %s' %(dfte.shape,))
-            except:
+            if dfte is None:
                 print('    File not loadable. Please check your file path or encoding format and try again.')
                 return dataname
+            print('    Shape of your Data Set loaded: %s' %(dfte.shape,))
+        elif is_parquet_file(dataname):
+            ### nrows are sampled while streaming record batches from the parquet file ###
+            if is_test_flag:
+                dfte = load_parquet_dataframe(dataname)
+            else:
+                dfte = load_parquet_dataframe(dataname, nrows=nrows, target=target)
+            print('    Shape of your Data Set loaded: %s' %(dfte.shape,))
         elif dataname.endswith(('xlsx','xls','txt')):
             #### It's very important to get header rows in Excel since people put headers anywhere in Excel#
             dfte = pd.read_excel(dataname,header=header, parse_dates=parse_dates)
@@ -262,6 +535,9 @@ def load_file_dataframe(dataname, sep=",", header=0, verbose=0,
     ####################################################################################
     if not nrows is None:
         if nrows < dfte.shape[0]:
+            if isinstance(dataname, str):
+                ### Files that cannot be streamed such as Excel files are sampled here ###
+                modelt, _ = analyze_problem_type(dfte[target], target)
             if modelt == 'Regression':
                 dfte = dfte[:nrows]
                 print('        sequentially select %s max_rows from dataset %d...' %(nrows, dfte.shape[0]))
@@ -430,7 +706,68 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             data sets faster using parallel processing. It detects the number of CPUs and GPU's in your machine
             automatically and sets the num of workers for DASK. It also uses DASK XGBoost to run it.
         nrows: default = None: None means all rows will be utilized. If you want to sample "N" rows, set nrows=N.
+            For csv files, the rows are sampled while streaming the file (stratified by target for
+            classification and the first N rows for regression) so the full file is never loaded.
         skip_sulov: a new flag to skip SULOV method. It will automatically go straight to recursive xgboost.
+        chunksize: default = None. If you want to stream a huge csv file in chunks of "N" rows, set chunksize=N.
+            The encoding and dtypes are found from a small sample and integer columns are downcast chunk by chunk.
+        float_error_limit: default = None. When a large dataset is reduced in memory, floats become float32.
+            Set a max relative error (such as 0.001) to allow float16 for columns that stay within it on a sample.
+        parquet_columns: default = None. If dataname is a parquet file or dataset (directory), you can give a
+            list of candidate predictors to read. The target is always read. Either way, columns that featurewiz
+            would drop after classifying a small sample are never read from disk.
+        parquet_filters: default = None. A row filter pushed down to pyarrow when reading a parquet train file,
+            in pyarrow's DNF format such as [('year', '>=', 2020)].
+        make_copy: default = True. featurewiz takes one copy of the dataframes you send in and works in place
+            on that copy. Set it to False to save that copy when your dataframes are large and you don't need
+            them afterwards. Beware that dataname and test_data may then be modified by featurewiz.
+        scratch_dir: default = None. Give a directory with enough disk space to spill the numeric feature matrix
+            to memory-mapped .npy files in it. SULOV and the recursive XGBoost rounds then read from those files
+            instead of RAM. Use it when the numeric matrix does not fit in memory. The files are deleted after use.
+        n_jobs: default = None. Number of worker processes used to profile and classify the columns and to find
+            mutual info scores in SULOV, and the number of BLAS threads used to find correlations in SULOV.
+            -1 means all the cpu's. Worker processes help when you have thousands of columns. None means one
+            worker process and the default BLAS threads.
+        profile_path: default = None. Give a file path to save the column profile used to classify the columns.
+            On the next run on the same table with new rows appended, only the new rows are profiled. The
+            profile is then taken from all the rows instead of a random sample of 10,000 rows, so that the
+            column types do not change from run to run. Use it only on tables that grow by appending rows.
+            The profile is made again if the first or last profiled rows or the file name have changed.
+            It cannot be used with nrows, since a sample of rows is not the same rows from run to run.
+        mi_method: default = 'knn'. The estimator of the mutual information scores that SULOV uses to rank
+            correlated features. 'knn' is sklearn's KNN estimator: it is the most accurate but the slowest,
+            so SULOV finds mutual info on a sample of 10,000 rows when the data has over 50 million cells
+            (the correlations are still found on all rows, one chunk of rows at a time: only the train
+            dataframe already loaded in memory is streamed, so this bounds the extra memory of the
+            correlations and not the memory of the data). 'histogram'
+            bins every feature into quantile bins and is the fastest on millions of rows. 'knn_sample' runs the KNN
+            estimator on random samples of rows that are doubled until the rankings on two samples agree.
+            With 'histogram' and 'knn_sample', SULOV always runs on all the rows.
+        xgb_round_jobs: default = None. Number of recursive XGBoost rounds trained at the same time in a pool
+            of threads. -1 trains all the rounds at once. The features are still selected round by round in
+            order, so the result is the same as training one round at a time (None). Each round running at
+            once holds its own DMatrix of its columns in memory.
+        xgb_round_nthread: default = None. Number of XGBoost threads of each round when xgb_round_jobs is
+            given. None splits the cpu's evenly among the rounds running at once.
+        early_stopping_rounds: default = None. By default the recursive XGBoost rounds use 100 boosting rounds
+            (20 when there are 100,000 rows or more). If a number such as 10 is given, the first recursive round
+            holds out a random 20% of rows and stops boosting once the holdout score has not improved for that
+            many boosting rounds. Its best number of boosting rounds is then used by all the other rounds.
+        progressive_sample_rows: default = None. Use it on huge datasets where the feature importances settle
+            well before all the rows are used. If a number of rows such as 100000 is given, the first recursive
+            round trains on a random sample of that many rows (stratified by class for classification) and
+            doubles it until the top features of two samples in a row agree (Jaccard similarity of 0.9 or more).
+            All the rounds then train on that sample. The sample size used is printed. If the top features
+            have not settled by half the rows, all the rows are used.
+        importance_type: default = 'gain'. The feature importance that the recursive XGBoost rounds rank features by.
+            'gain' is XGBoost's total gain of the splits on each feature. It is the fastest but it favors features
+            with many values, such as label-encoded categorical vars. 'shap' is the mean absolute SHAP value of
+            each feature (TreeSHAP) on a sample of 2,000 rows. 'permutation' is the mean increase in loss over 5
+            shuffles of each feature, on 5,000 rows that the scoring booster was not trained on (each half of the
+            rows is scored by a booster trained on the other half). Many shuffled features are scored in one
+            predict call. A feature whose increase is within its spread or below 1% of the loss gets 0.
+            A feature is selected only if its importance is above 1.0 for 'gain' and above 0 otherwise.
+            The time taken to find the importances is printed for 'shap' and 'permutation'.
     ########           Featurewiz Output           #############################
     Output: Tuple
     Featurewiz can output either a list of features or one dataframe or two depending on what you send in.
@@ -450,16 +787,30 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
         print('ALERT: nrows=%s. Hence featurewiz will randomly sample that many rows.' %nrows)
         print('    Change nrows=None if you want all rows...')
     ### set all the defaults here ##############################################
-    dataname = copy.deepcopy(dataname)
     max_nums = 30
     max_cats = 15
     maxrows = 10000
     RANDOM_SEED = 42
     mem_limit = 500 ### amount of memory consumed by pandas df before reducing_mem function called
+    train_dtype_plan = None ### the dtype plan found on train is re-used on test data
     ############################################################################
     cat_encoders_list = list(settings.cat_encoders_names.keys())
     ### Just set defaults here which can be overridden by user input ####
     cat_vars = []
+    chunksize = None
+    float_error_limit = None
+    parquet_columns = None
+    parquet_filters = None
+    make_copy = True
+    scratch_dir = None
+    n_jobs = None
+    profile_path = None
+    mi_method = 'knn'
+    xgb_round_jobs = None
+    xgb_round_nthread = None
+    early_stopping_rounds = None
+    progressive_sample_rows = None
+    importance_type = 'gain'
     if kwargs:
         for key, value in zip(kwargs.keys(), kwargs.values()):
             print('You supplied %s = %s' %(key, value))
@@ -472,6 +823,45 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 else:
                     print('cat vars must be a list or a string')
                     return
+            elif key == 'chunksize':
+                chunksize = value
+            elif key == 'float_error_limit':
+                float_error_limit = value
+            elif key == 'parquet_columns':
+                parquet_columns = value
+            elif key == 'parquet_filters':
+                parquet_filters = value
+            elif key == 'make_copy':
+                make_copy = value
+            elif key == 'scratch_dir':
+                scratch_dir = value
+            elif key == 'n_jobs':
+                n_jobs = value
+            elif key == 'profile_path':
+                profile_path = value
+            elif key == 'mi_method':
+                mi_method = value
+            elif key == 'xgb_round_jobs':
+                xgb_round_jobs = value
+            elif key == 'xgb_round_nthread':
+                xgb_round_nthread = value
+            elif key == 'early_stopping_rounds':
+                early_stopping_rounds = value
+            elif key == 'progressive_sample_rows':
+                progressive_sample_rows = value
+            elif key == 'importance_type':
+                importance_type = value
+    if profile_path and nrows:
+        print('profile_path needs all the rows of the same table on every run. It cannot be used with nrows.')
+        return
+    ###### the file name of the train data is saved with its profile ######
+    profile_source = dataname if isinstance(dataname, str) else None
+    ###### featurewiz takes one copy of the dataframes given and works in place after that #####
+    if make_copy:
+        if isinstance(dataname, pd.DataFrame):
+            dataname = copy.deepcopy(dataname)
+        if isinstance(test_data, pd.DataFrame):
+            test_data = copy.deepcopy(test_data)
     ######################################################################################
     #####      MAKING FEATURE_TYPE AND FEATURE_GEN SELECTIONS HERE           #############
     ######################################################################################
@@ -509,6 +899,20 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             import feather
             dataname = pd.read_feather(dataname, use_threads=True)
             train = load_dask_data(dataname, sep)
+        elif is_parquet_file(dataname):
+            print("""**INFO: Parquet format allowed. Loading only the needed columns of parquet file...**""")
+            parquet_columns = find_parquet_columns_to_load(dataname, target, parquet_columns,
+                                    parquet_filters, sample_rows=maxrows)
+            dataname = load_parquet_dataframe(dataname, columns=parquet_columns, filters=parquet_filters,
+                                    nrows=nrows, target=target)
+            print('    Shape of your Data Set loaded: %s' %(dataname.shape,))
+            if (dataname.memory_usage().sum()/1000000) > mem_limit:
+                dataname, train_dtype_plan = reduce_mem_usage(dataname, return_plan=True,
+                                        float_error_limit=float_error_limit, verbose=verbose)
+            if dask_xgboost_flag:
+                train = load_dask_data(dataname, sep)
+            else:
+                train = dataname
         else:
             if verbose:
                 print("""**INFO: to increase file loading performance, convert huge `csv` files to `feather` format""")
@@ -518,7 +922,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                     print('    Since dask_xgboost_flag is True, reducing memory size and loading into dask')
                     dataname = pd.read_csv(dataname, sep=sep, header=header, nrows=nrows)
                     if (dataname.memory_usage().sum()/1000000) > mem_limit:
-                        dataname = reduce_mem_usage(dataname)
+                        dataname, train_dtype_plan = reduce_mem_usage(dataname, return_plan=True,
+                                        float_error_limit=float_error_limit, verbose=verbose)
                     train = load_dask_data(dataname, sep)
                 except:
                     print('File could not be loaded into dask. Check the path or filename and try again')
@@ -526,11 +931,13 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             else:
                 #### There is no dask flag so load it into a regular pandas dataframe ####
                 train = load_file_dataframe(dataname, sep=sep, header=header, verbose=verbose, 
-                                    nrows=nrows, target=target)
+                                    nrows=nrows, target=target, chunksize=chunksize)
                 if (train.memory_usage().sum()/1000000) > mem_limit:
-                    dataname = reduce_mem_usage(train)
+                    dataname, train_dtype_plan = reduce_mem_usage(train, return_plan=True,
+                                        float_error_limit=float_error_limit, verbose=verbose)
+                    train = dataname
                 else:
-                    dataname = copy.deepcopy(train)
+                    dataname = train
     else:
         #### This is where we get a dataframe as an input #################
         if dask_xgboost_flag:
@@ -539,29 +946,34 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 print('Sampling %s rows from dataframe given' %nrows)
             print('    Since dask_xgboost_flag is True, reducing memory size and loading into dask')
             if (dataname.memory_usage().sum()/1000000) > mem_limit:
-                dataname = reduce_mem_usage(dataname)
+                dataname, train_dtype_plan = reduce_mem_usage(dataname, return_plan=True,
+                                        float_error_limit=float_error_limit, verbose=verbose)
             train = load_dask_data(dataname, sep)
         else:
             train = load_file_dataframe(dataname, sep=sep, header=header, verbose=verbose, 
-                            nrows=nrows, target=target)
+                            nrows=nrows, target=target, make_copy=False)
             if (train.memory_usage().sum()/1000000) > mem_limit:
-                dataname = reduce_mem_usage(train)
+                dataname, train_dtype_plan = reduce_mem_usage(train, return_plan=True,
+                                        float_error_limit=float_error_limit, verbose=verbose)
+                train = dataname
             else:
-                dataname = copy.deepcopy(train)
+                dataname = train
     print('    Loaded train data. Shape = %s' %(dataname.shape,))
 
     ##################    L O A D    T E S T   D A T A      ######################
-    dataname = remove_duplicate_cols_in_dataset(dataname)
+    dataname = remove_duplicate_cols_in_dataset(dataname, make_copy=False)
 
     #### Convert mixed data types to string data type  ############################
     #dataname = FE_convert_mixed_datatypes_to_string(dataname)
     
     ######   XGBoost cannot handle special chars in column names ###########
     uniq = Column_Names_Transformer()
-    dataname = uniq.fit_transform(dataname)
+    uniq.fit(dataname)
     new_col_names = uniq.new_column_names
     old_col_names = uniq.old_column_names
     special_char_flag = uniq.transformed_flag
+    ### renaming in place does not copy the data ###
+    dataname.rename(columns=uniq.rename_dict, inplace=True)
 
     ### Suppose you have changed the names, thenn you must load it in dask again ##    
     if special_char_flag:
@@ -617,6 +1029,14 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 import feather
                 test_data = pd.read_feather(test_data, use_threads=True)
                 test = load_dask_data(test_data, sep)
+            elif is_parquet_file(test_data):
+                print('Loading test data parquet file = %s...' %test_data)
+                ### only read the same columns that were read from train ###
+                test_data = load_parquet_dataframe(test_data, columns=parquet_columns)
+                if dask_xgboost_flag:
+                    test = load_dask_data(test_data, sep)
+                else:
+                    test = test_data
             else:
                 if verbose:
                     print("""**INFO: to increase file loading performance, convert huge `csv` files to `feather` format using `df.to_feather("path/to/save/file.feather")`**""")
@@ -627,17 +1047,21 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                     print('    Since dask_xgboost_flag is True, reducing memory size and loading into dask')
                     ### nrows does not apply to test data in the case of featurewiz ###############
                     test_data = load_file_dataframe(test_data, sep=sep, header=header, verbose=verbose,
-                                     nrows=None, target=settings.modeltype, is_test_flag=True)
+                                     nrows=None, target=settings.modeltype, is_test_flag=True,
+                                     chunksize=chunksize)
                     ### sometimes, test_data returns None if there is an error. ##########
                     if test_data is not None:
-                        test_data = reduce_mem_usage(test_data)
+                        ### re-use the train dtype plan so train and test get the same dtypes ###
+                        test_data = reduce_mem_usage(test_data, dtype_plan=train_dtype_plan,
+                                        float_error_limit=float_error_limit)
                         ### test_data is the pandas dataframe object and test is dask dataframe object ##
                         test = load_dask_data(test_data, sep)
                 else:
                     #### load the entire test dataframe - there is no limit applicable there #########
                     test_data = load_file_dataframe(test_data, sep=sep, header=header, 
-                                    verbose=verbose, nrows=None, target=settings.modeltype, is_test_flag=True)
-                    test = copy.deepcopy(test_data)
+                                    verbose=verbose, nrows=None, target=settings.modeltype, is_test_flag=True,
+                                    chunksize=chunksize)
+                    test = test_data
         else:
             print('No test data filename given...')
             test_data = None
@@ -645,16 +1069,17 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     else:
         print('loading the entire test dataframe - there is no nrows limit applicable #########')
         test_data = load_file_dataframe(test_data, sep=sep, header=header, 
-                        verbose=verbose, nrows=None, target=settings.modeltype, is_test_flag=True)
-        test = copy.deepcopy(test_data)
+                        verbose=verbose, nrows=None, target=settings.modeltype, is_test_flag=True,
+                        make_copy=False)
+        test = test_data
     ### sometimes, test_data returns None if there is an error. ##########
     
     if test_data is not None:
-        test_data = remove_duplicate_cols_in_dataset(test_data)
+        test_data = remove_duplicate_cols_in_dataset(test_data, make_copy=False)
         test_index = test_data.index
         print('    Loaded test data. Shape = %s' %(test_data.shape,))
         #######  Once again remove special chars in test data as well ###
-        test_data = uniq.transform(test_data)
+        test_data.rename(columns=uniq.rename_dict, inplace=True)
 
         ### Suppose you have changed the names, thenn you must load it in dask again ##    
         if special_char_flag:
@@ -674,39 +1099,49 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
         targets = [target]
     else:
         targets = copy.deepcopy(target)
-    if dataname.shape[0] >= nrows_limit:
+    if profile_path:
+        print('Classifying features using the saved profile in %s updated with new rows...' %profile_path)
+        features_dict = classify_features(dataname, target, n_jobs=n_jobs, profile_path=profile_path,
+                                          profile_source=profile_source)
+    elif dataname.shape[0] >= nrows_limit:
         print('Classifying features using a random sample of %s rows from dataset...' %nrows_limit)
         ##### you can use nrows_limit to select a small sample from data set ########################
         train_small = EDA_randomly_select_rows_from_dataframe(dataname, targets, nrows_limit, DS_LEN=dataname.shape[0])
-        features_dict = classify_features(train_small, target)
+        features_dict = classify_features(train_small, target, n_jobs=n_jobs)
     else:
-        features_dict = classify_features(dataname, target)
+        features_dict = classify_features(dataname, target, n_jobs=n_jobs)
     #### Now we have to drop certain cols that must be deleted #####################
     remove_cols = features_dict['discrete_string_vars'] + features_dict['cols_delete']
     if len(remove_cols) > 0:
         print('train data shape before dropping %d columns = %s' %(len(remove_cols), dataname.shape,))
         dataname.drop(remove_cols, axis=1, inplace=True)
         print('\ttrain data shape after dropping columns = %s' %(dataname.shape,))
-        train = load_dask_data(dataname, sep)
+        if dask_xgboost_flag:
+            train = load_dask_data(dataname, sep)
+        else:
+            train = dataname
         if not test_data is None:
             test_data.drop(remove_cols, axis=1, inplace=True)
-            test = load_dask_data(test_data, sep)
+            if dask_xgboost_flag:
+                test = load_dask_data(test_data, sep)
+            else:
+                test = test_data
     ################    Load data frame with date var features correctly this time ################
     if len(features_dict['date_vars']) > 0:
         print('Caution: Since there are date-time variables in dataset, it is best to load them using pandas')
         dask_xgboost_flag = False ### Set the dask flag to be False since it is now becoming Pandas dataframe 
         date_time_vars = features_dict['date_vars']
         dataname = load_file_dataframe(dataname, sep=sep, header=header, verbose=verbose, 
-                            nrows=nrows, parse_dates=date_time_vars, target=target)
+                            nrows=nrows, parse_dates=date_time_vars, target=target, make_copy=False)
         if (dataname.memory_usage().sum()/1000000) > mem_limit:
-            dataname = reduce_mem_usage(dataname)
-        train = load_dask_data(dataname, sep)
+            dataname = reduce_mem_usage(dataname, float_error_limit=float_error_limit)
+        train = dataname
         if not test_data is None:
             ### You must load the entire test data - there is no limit there ##################
-            ### test_data is the pandas dataframe object and test is dask dataframe object ##
             test_data = load_file_dataframe(test_data, sep=sep, header=header, verbose=verbose, 
-                                 nrows=nrows, parse_dates=date_time_vars, target=settings.modeltype, is_test_flag=True )
-            test = copy.deepcopy(test_data)
+                                 nrows=nrows, parse_dates=date_time_vars, target=settings.modeltype, is_test_flag=True,
+                                 make_copy=False)
+            test = test_data
         else:
             test_data = None
             test = None
@@ -807,7 +1242,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
         date_col_mappers = {}
         for date_col in date_cols:
             print('Processing %s column for date time features....' %date_col)
-            dataname, ts_adds = FE_create_time_series_features(dataname, date_col)
+            dataname, ts_adds = FE_create_time_series_features(dataname, date_col, make_copy=False,
+                                    date_format=features_dict['date_formats'].get(date_col))
             date_col_mapper = dict([(x,date_col) for x in ts_adds])
             date_col_mappers.update(date_col_mapper)
             #print('    Adding %d column(s) from date-time column %s in train' %(len(date_col_adds_train),date_col))
@@ -817,7 +1253,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 pass
             else:
                 print('        Adding same time series features to test data...')
-                test_data, _ = FE_create_time_series_features(test_data, date_col, ts_adds)
+                test_data, _ = FE_create_time_series_features(test_data, date_col, ts_adds, make_copy=False,
+                                    date_format=features_dict['date_formats'].get(date_col))
                 #date_col_adds_test_data = left_subtract(date_df_test.columns.tolist(),date_col)
                 ### Now time to remove the date time column from all further processing ##
                 #test = test.join(date_df_test, rsuffix='2')
@@ -861,13 +1298,19 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             print('Adding %s interactions between categorical_vars %s...' %(
                                 num_combos, catvars))
             dataname = FE_create_interaction_vars(dataname, catvars)
-            train = FE_create_interaction_vars(train, catvars)
+            if dask_xgboost_flag:
+                train = FE_create_interaction_vars(train, catvars)
+            else:
+                train = dataname
             catvars = left_subtract(dataname.columns.tolist(), numvars)
             catvars = left_subtract(catvars, target)
             preds =  left_subtract(dataname.columns.tolist(), target)
             if not test_data is None:
                 test_data = FE_create_interaction_vars(test_data, catvars)
-                test = FE_create_interaction_vars(test, catvars)
+                if dask_xgboost_flag:
+                    test = FE_create_interaction_vars(test, catvars)
+                else:
+                    test = test_data
         else:
             if verbose:
                 print('No interactions created for categorical vars since number less than 2')
@@ -898,7 +1341,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 dataname[each_target] = mlb.fit_transform(dataname[each_target])
                 try:
                     ## After converting train, just load it into dask again ##
-                    train[each_target] = dd.from_pandas(dataname[each_target], npartitions=n_workers)
+                    if dask_xgboost_flag:
+                        train[each_target] = dd.from_pandas(dataname[each_target], npartitions=n_workers)
                 except:
                     print('Could not convert dask dataframe target into numeric. Check your input. Continuing...')
                 if test_data is not None:
@@ -906,7 +1350,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                         test_data[each_target] = mlb.transform(test_data[each_target])
                         try:
                             ## After converting test, just load it into dask again ##
-                            test[each_target] = dd.from_pandas(test_data[each_target], npartitions=n_workers)
+                            if dask_xgboost_flag:
+                                test[each_target] = dd.from_pandas(test_data[each_target], npartitions=n_workers)
                         except:
                             print('Could not convert dask dataframe target into numeric. Check your input. Continuing...')
                 print('Completed label encoding of target variable = %s' %each_target)
@@ -1057,21 +1502,30 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     
     start_time1 = time.time()
     if len(numvars) > 1 and not skip_sulov:
-        if data_dim < 50:
+        if data_dim < 50 or mi_method != 'knn':
+            if data_dim >= 50:
+                print('    Running SULOV on all rows with mi_method=%s though data size %s m > 50 m. Continuing ...' %(
+                                mi_method, int(data_dim)))
             try:
                 final_list = FE_remove_variables_using_SULOV_method(dataname,numvars,settings.modeltype,target,
-                             corr_limit,verbose, dask_xgboost_flag)
+                             corr_limit,verbose, dask_xgboost_flag, scratch_dir=scratch_dir, n_jobs=n_jobs,
+                             mi_method=mi_method)
             except:
                 print('    SULOV method is erroring. Continuing ...')
                 final_list = copy.deepcopy(numvars)
         else:
-                print('    Running SULOV on smaller dataset sample since data size %s m > 50 m. Continuing ...' %int(data_dim))
+                print('    Running SULOV correlations on all rows in chunks but mutual info on a sample since data size %s m > 50 m. Continuing ...' %int(data_dim))
+                #### correlations are exact over all rows: only their sums and cross-products are kept ###
+                #### Only the dataframe already in memory is streamed here: the file is not read again ###
+                corr_pairs = find_correlated_pairs_from_chunks(find_row_chunks(dataname, numvars),
+                                numvars, corr_limit, n_jobs=n_jobs)
                 if settings.modeltype != 'Regression':
                     data_temp = dataname.sample(n=10000, replace=True, random_state=99)
                 else:
                     data_temp = dataname[:10000]
                 final_list = FE_remove_variables_using_SULOV_method(data_temp,numvars,settings.modeltype,target,
-                             corr_limit,verbose, dask_xgboost_flag)
+                             corr_limit,verbose, dask_xgboost_flag, scratch_dir=scratch_dir, n_jobs=n_jobs,
+                             mi_method=mi_method, corr_pairs=corr_pairs)
                 del data_temp
     elif skip_sulov:
         print('    Skipping SULOV method. Continuing ...')
@@ -1102,7 +1556,9 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     if not test_data is None:
         test_data = test_data[preds]
     if len(important_cats) > 0:
-        dataname, test_data, error_columns = FE_convert_all_object_columns_to_numeric(dataname,  test_data, preds)
+        ### dataname and test_data were just re-selected above: convert them in place ###
+        dataname, test_data, error_columns = FE_convert_all_object_columns_to_numeric(dataname,  test_data, preds,
+                                                            make_copy=False)
         important_cats = left_subtract(important_cats, error_columns)
         if len(error_columns) > 0:
             print('    removing %s object columns that could not be converted to numeric' %len(error_columns))
@@ -1148,8 +1604,8 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
         ### we reload the dataframes into dask since columns may have been dropped ##
         if verbose:
             print('    using regular XGBoost') 
-        train = copy.deepcopy(dataname)
-        test = copy.deepcopy(test_data)
+        train = dataname
+        test = test_data
     ########  Conversion completed for train and test data ##########
    #### If Category Encoding took place, these cat variables are no longer needed in Train. So remove them!
     if feature_gen or feature_type:
@@ -1157,8 +1613,17 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
         preds = left_subtract(preds, catvars)
     if dask_xgboost_flag:
         train_p = train[preds]
+        X_working_set = None
     else:
-        train_p = dataname[preds]
+        ### The numeric block is copied once into a float32 working set.              ########
+        ###   Each round below takes a zero-copy view of it instead of slicing dataframes. ###
+        try:
+            X_working_set = create_numeric_working_set(dataname, preds, scratch_dir=scratch_dir)
+            train_p = pd.DataFrame(X_working_set, columns=preds, index=dataname.index, copy=False)
+        except Exception as error_msg:
+            print('    Could not build a float32 working set due to %s. Continuing...' %error_msg)
+            X_working_set = None
+            train_p = dataname[preds]
     ######## Limit the number of iterations to 5 or so #######
     if train_p.shape[1] <= 10:
         iter_limit = 2
@@ -1193,11 +1658,36 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
     else:
         y_train = dataname[target]
     #### Now we process the numeric  values through DASK XGBoost repeatedly ###################    
+    dtrain = dtrain_all = None
+    first_build_time = first_train_time = 0
+    #### The rounds only depend on each other through top_num which is applied in order below. ####
+    ####   So their models can be trained at the same time while the features are selected in order.
+    best_num_rounds = None
+    sample_checked = False
+    #### gain is summed over splits while shap and permutation importances are mean effects per row ####
+    if importance_type not in ['gain', 'shap', 'permutation']:
+        print('    importance_type must be one of gain, shap or permutation. Using gain...')
+        importance_type = 'gain'
+    if importance_type != 'gain' and (dask_xgboost_flag or settings.multi_label):
+        print('    %s importances are found only with regular single-label XGBoost. Using gain...' %importance_type)
+        importance_type = 'gain'
+    if importance_type == 'gain':
+        min_importance = 1.0
+    else:
+        min_importance = 0.0
+    importance_time = 0
+    parallel_rounds = (xgb_round_jobs is not None and xgb_round_jobs != 1 and not dask_xgboost_flag
+                            and not settings.multi_label)
+    trained_rounds = None
     try:
         for i in range(0,train_p.shape[1],iter_limit):
             start_time2 = time.time()
             imp_feats = []
-            if train_p.shape[1]-i < iter_limit:
+            if X_working_set is not None and not settings.multi_label:
+                #### a column suffix of the working set is a zero-copy strided view ###
+                X_train = X_working_set[:, i:]
+                cols_sel = train_p.columns[i:].tolist()
+            elif train_p.shape[1]-i < iter_limit:
                 X_train = train_p.iloc[:,i:]
                 cols_sel = X_train.columns.tolist()
             else:
@@ -1214,6 +1704,9 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 num_rounds = 100
             if i == 0:
                 print('Number of booster rounds = %s' %num_rounds)
+            default_num_rounds = num_rounds
+            if best_num_rounds:
+                num_rounds = best_num_rounds
 
             if train_p.shape[1]-i <= top_num:
                 ### If there is just one variable left, then just skip it #####
@@ -1287,12 +1780,106 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                     #### now this training via bst works well for both xgboost 0.0.90 as well as 1.5.1 ##
                     
                     try:
+                        #### With progressive_sample_rows, the first round finds the rows that all rounds train on ####
+                        if progressive_sample_rows and not sample_checked:
+                            sample_checked = True
+                            try:
+                                sample_index = find_stable_sample_rows(
+                                                X_working_set if X_working_set is not None else train_p,
+                                                y_train, preds, i, params, top_num, settings.modeltype,
+                                                progressive_sample_rows, tree_method)
+                            except Exception as error_msg:
+                                print('    Progressive sampling is erroring due to %s. Using all rows...' %error_msg)
+                                sample_index = None
+                            if sample_index is not None:
+                                if X_working_set is not None:
+                                    X_full = X_working_set
+                                    X_working_set = X_working_set[sample_index]
+                                    delete_numeric_working_set(X_full)
+                                    train_p = pd.DataFrame(X_working_set, columns=preds,
+                                                    index=train_p.index[sample_index], copy=False)
+                                    X_full = None
+                                    X_train = X_working_set[:, i:]
+                                else:
+                                    train_p = train_p.iloc[sample_index]
+                                    X_train = train_p.iloc[:, i:]
+                                y_train = y_train.iloc[sample_index]
+                                if len(sample_index) >= 100000:
+                                    num_rounds = default_num_rounds = 20
+                                else:
+                                    num_rounds = default_num_rounds = 100
                         if settings.modeltype == 'Multi_Classification':
                             wt_array = get_sample_weight_array(y_train)
-                            dtrain = xgb.DMatrix(X_train, label=y_train, weight=wt_array, feature_names=cols_sel)
                         else:
-                            dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=cols_sel)
-                        bst = xgb.train(params, dtrain, num_boost_round=num_rounds)                
+                            wt_array = None
+                        #### With early_stopping_rounds, the first round finds the number of boosting rounds ####
+                        bst_holdout = None
+                        if early_stopping_rounds and not best_num_rounds:
+                            try:
+                                bst_holdout, best_num_rounds = train_xgboost_with_early_stopping(
+                                                X_working_set if X_working_set is not None else train_p,
+                                                y_train, preds, i, params, early_stopping_rounds,
+                                                settings.modeltype, tree_method, weight=wt_array)
+                                print('    Early stopping on a 20%% holdout found %d boosting rounds (instead of %d) for all rounds' %(
+                                                best_num_rounds, num_rounds))
+                                num_rounds = best_num_rounds
+                            except Exception as error_msg:
+                                print('    Early stopping is erroring due to %s. Using %d boosting rounds...' %(
+                                                error_msg, num_rounds))
+                                early_stopping_rounds = None
+                        if bst_holdout is not None:
+                            bst = bst_holdout
+                        else:
+                            #### With xgb_round_jobs, all the rounds are trained at once when the first one is reached ####
+                            if parallel_rounds and trained_rounds is None:
+                                try:
+                                    start_train = time.time()
+                                    trained_rounds = train_xgboost_rounds_in_parallel(
+                                                    X_working_set if X_working_set is not None else train_p,
+                                                    y_train, preds, list(range(i, train_p.shape[1], iter_limit)),
+                                                    params, num_rounds, tree_method, xgb_round_jobs,
+                                                    nthread=xgb_round_nthread, weight=wt_array)
+                                    train_time = time.time() - start_train
+                                    if verbose and best_num_rounds:
+                                        time_saved = train_time*(default_num_rounds/num_rounds-1)
+                                        print('            %d boosting rounds instead of %d %s about %0.1f seconds in the %d rounds trained in parallel' %(
+                                                num_rounds, default_num_rounds, 'saved' if time_saved >= 0 else 'took',
+                                                abs(time_saved), len(trained_rounds)) + ('' if time_saved >= 0 else ' more'))
+                                except Exception as error_msg:
+                                    print('    Could not train XGBoost rounds in parallel due to %s. Training one at a time...' %error_msg)
+                                    parallel_rounds = False
+                            if trained_rounds is not None and i in trained_rounds:
+                                bst = trained_rounds[i]
+                            else:
+                                #### The first round sketches all predictors into one DMatrix. Later rounds mask the
+                                ####   columns before their window instead of sketching their columns again. Masked
+                                ####   columns still cost time in tree building. So once the times of the first round
+                                ####   show that building a DMatrix of the window is cheaper, the rounds build their own.
+                                window_share = (train_p.shape[1]-i)/train_p.shape[1]
+                                if (dtrain_all is None and not first_train_time) or (dtrain_all is not None and
+                                        first_train_time < window_share*(first_build_time+first_train_time)):
+                                    if dtrain_all is None:
+                                        start_build = time.time()
+                                        dtrain_all = build_feature_selection_matrix(
+                                                        X_working_set if X_working_set is not None else train_p,
+                                                        y_train, preds, tree_method, weight=wt_array)
+                                        first_build_time = time.time() - start_build
+                                    dtrain = dtrain_all
+                                    round_params = find_feature_window_params(dtrain, params, i)
+                                else:
+                                    dtrain_all = None
+                                    dtrain = xgb.DMatrix(X_train, label=y_train, weight=wt_array, feature_names=cols_sel)
+                                    round_params = params
+                                start_train = time.time()
+                                bst = xgb.train(round_params, dtrain, num_boost_round=num_rounds)
+                                train_time = time.time() - start_train
+                                if not first_train_time:
+                                    first_train_time = train_time
+                                if verbose and best_num_rounds:
+                                    time_saved = train_time*(default_num_rounds/num_rounds-1)
+                                    print('            %d boosting rounds instead of %d %s about %0.1f seconds in this round' %(
+                                            num_rounds, default_num_rounds, 'saved' if time_saved >= 0 else 'took',
+                                            abs(time_saved)) + ('' if time_saved >= 0 else ' more'))
                     except Exception as error_msg:
                         print('Regular XGBoost is crashing due to: %s' %error_msg)
                         if settings.modeltype == 'Regression':
@@ -1300,7 +1887,9 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                         else:
                             params = {'tree_method': cpu_tree_method,'num_class': num_class, 'gpu_id': None}
                         print(error_msg)
-                        bst = xgb.train(params, dtrain, num_boost_round=num_rounds)                
+                        if dtrain is not None and dtrain is dtrain_all:
+                            params = find_feature_window_params(dtrain, params, i)
+                        bst = xgb.train(params, dtrain, num_boost_round=num_rounds)
                 else:
                     ################################################################################
                     ##########   Training XGBoost model using dask_xgboost #########################
@@ -1340,7 +1929,14 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
                 imp_feats = dict(zip(X_train.columns, bst.estimators_[0].feature_importances_))
             else:
                 if not dask_xgboost_flag:
-                    imp_feats = bst.get_score(fmap='', importance_type='gain')
+                    start_importance = time.time()
+                    imp_feats = find_xgboost_importances(bst, X_working_set if X_working_set is not None else train_p,
+                                        y_train, preds, importance_type, settings.modeltype,
+                                        params=params, num_rounds=num_rounds, weight=wt_array, start=i)
+                    importance_time += time.time() - start_importance
+                    if verbose and importance_type != 'gain':
+                        print('            %s importances found in %0.1f seconds' %(importance_type,
+                                        time.time()-start_importance))
                 else:
                     imp_feats = bst['booster'].get_score(fmap='', importance_type='gain')
             ### skip the next statement since it is duplicating the work of sort_values ##
@@ -1349,14 +1945,14 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             
             #imp_feats = model_xgb.get_booster().get_score(importance_type='gain')
             #print('%d iteration: imp_feats = %s' %(i+1,imp_feats))
-            imp_feats =  pd.Series(imp_feats).sort_values(ascending=False)[pd.Series(imp_feats).sort_values(ascending=False)>1.0]
+            imp_feats =  pd.Series(imp_feats).sort_values(ascending=False)[pd.Series(imp_feats).sort_values(ascending=False)>min_importance]
             if len(imp_feats) > 0:
                 if len(imp_feats) > top_num:
                     top_num = int(len(imp_feats) * 0.5)
                 important_features += imp_feats[:top_num].index.tolist()
                 print('            selecting %s features in this iteration' %len(imp_feats[:top_num]))
             else:
-                print('            not selecting any important features since it did not meet criteria: F-score > 1.0')
+                print('            not selecting any important features since it did not meet criteria: F-score > %s' %min_importance)
             #######  order this in the same order in which they were collected ######
             important_features = list(OrderedDict.fromkeys(important_features))
             if verbose:
@@ -1378,7 +1974,12 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             print('Regular XGBoost is crashing due to %s. Returning with currently selected features...' %e)
         important_features = copy.deepcopy(preds)
     ######    E    N     D      O  F      X  G  B  O  O  S  T    S E L E C T I O N ####################
+    if importance_type != 'gain':
+        print('    Time taken for %s importances = %0.1f seconds' %(importance_type, importance_time))
     print('    Completed XGBoost feature selection in %0.0f seconds' %(time.time()-start_time2))
+    ### free the working set and the last DMatrix before the output dataframes are built ###
+    delete_numeric_working_set(X_working_set)
+    X_working_set = train_p = X_train = dtrain = dtrain_all = trained_rounds = None
     if len(idcols) > 0:
         print('    Alert: No ID variables %s are included in selected features' %idcols)
     print("#######################################################################################")
@@ -1500,23 +2101,6 @@ def featurewiz(dataname, target, corr_limit=0.8, verbose=0, sep=",", header=0,
             print('Warning: Returning with important features and train. Please re-check your outputs.')
             return important_features, dataname[important_features+targets]
 ################################################################################
-def remove_highly_correlated_vars_fast(df, corr_limit=0.70):
-    """
-    This is a simple method to remove highly correlated features fast using Pearson's Correlation.
-    Use this only for float and integer variables. It will automatically select those only.
-    It can be used for very large data sets where featurewiz has trouble with memory
-    """
-    # Creating correlation matrix
-    correlation_dataframe = df.corr().abs().astype(np.float16)
-    # Selecting upper triangle of correlation matrix
-    upper_tri = correlation_dataframe.where(np.triu(np.ones(correlation_dataframe.shape),
-                                  k=1).astype(np.bool))
-    # Finding index of feature columns with correlation greater than 0.95
-    to_drop = [column for column in upper_tri.columns if any(upper_tri[column] > corr_limit)]
-    print();
-    print('Highly correlated columns to remove: %s' %to_drop)
-    return to_drop
-#####################################################################################
 import multiprocessing
 def get_cpu_worker_count():
     return multiprocessing.cpu_count()
@@ -1527,6 +2111,280 @@ import matplotlib.pyplot as plt
 from sklearn.feature_selection import chi2, mutual_info_regression, mutual_info_classif
 from sklearn.feature_selection import SelectKBest
 import xgboost
+def build_feature_selection_matrix(X, y, feature_names, tree_method='hist', weight=None):
+    """
+    Builds one DMatrix of all the predictors for the recursive XGBoost rounds. With the hist tree
+    methods it is a QuantileDMatrix (xgboost 1.7 or later): the quantile sketch of each column is
+    found once here and the data is held as histogram bins, so no round sketches the columns again.
+    Each round then trains on its window of columns as set by find_feature_window_params.
+    """
+    if tree_method in ['hist', 'gpu_hist'] and hasattr(xgb, 'QuantileDMatrix'):
+        try:
+            return xgb.QuantileDMatrix(X, label=y, weight=weight, feature_names=feature_names)
+        except Exception as error_msg:
+            print('    Could not build a QuantileDMatrix due to %s. Using a DMatrix...' %error_msg)
+    return xgb.DMatrix(X, label=y, weight=weight, feature_names=feature_names)
+###################################################################################
+def find_xgboost_importances(bst, X, y, feature_names, importance_type='gain', modeltype='Regression',
+                            sample_rows=None, max_cells=1e7, n_repeats=5, min_loss_increase=0.01,
+                            params=None, num_rounds=100, weight=None, max_fit_rows=100000, start=None):
+    """
+    Finds the importance of each feature used by an XGBoost booster. The booster must have been
+    trained on a suffix of the columns of X (named feature_names) or on all of them.
+
+    Inputs:
+    importance_type: 'gain' (XGBoost's total gain), 'shap' (mean absolute TreeSHAP value on a
+        sample of rows) or 'permutation' (increase in loss on a sample of rows when a feature is
+        shuffled). For permutation, the sample is repeated once for each of a batch of features
+        with that feature shuffled, so that a batch of features is scored in one predict call.
+        Each batch holds about max_cells cells.
+    sample_rows: default is None. Number of rows sampled: 2,000 for shap (TreeSHAP is slow) and 5,000
+        for permutation.
+    n_repeats: number of shuffles of each feature for permutation. Its importance is the mean
+        increase in loss over the shuffles.
+    min_loss_increase: for permutation, a feature whose mean increase in loss is not more than its
+        standard deviation over the shuffles, or not more than this fraction of the loss of the
+        unshuffled sample, gets an importance of zero: its increase may be just noise.
+    params: default is None. For permutation, the params (and num_rounds and weight) that bst was
+        trained with. If given, the rows are split in two halves and each half is scored by a
+        booster trained the same way on up to max_fit_rows rows of the other half. On the rows a
+        booster was trained on, even features that it only memorised increase the loss when shuffled.
+        These boosters are trained on the window of columns from start onwards only.
+    start: default is None. The first column of the window of X that the round selects from. A booster
+        trained on the shared DMatrix of all columns (with the columns before start masked) sees all
+        the columns, so the window cannot be found from its feature names. If None, the window is all
+        the columns of the booster.
+
+    Outputs:
+    imp_feats: dictionary of each feature used by the booster and its importance.
+    """
+    gain_feats = bst.get_score(fmap='', importance_type='gain')
+    if importance_type == 'gain' or len(gain_feats) == 0:
+        return gain_feats
+    if sample_rows is None:
+        sample_rows = 2000 if importance_type == 'shap' else 5000
+    ### the booster was trained on the last len(bst.feature_names) columns ###
+    bst_start = len(feature_names) - len(bst.feature_names)
+    if start is None:
+        start = bst_start
+    y = np.asarray(y).ravel()
+    def find_rows_of_X(rows, first_col):
+        if isinstance(X, pd.DataFrame):
+            return X.iloc[rows, first_col:].values.astype(np.float32)
+        return np.asarray(X[rows, first_col:], dtype=np.float32)
+    ### the columns that a booster sees: all of them for bst, the window only for the cross-fit boosters ###
+    cols = feature_names[bst_start:]
+    rows = np.arange(X.shape[0])
+    if X.shape[0] > sample_rows:
+        rows = np.sort(np.random.RandomState(99).choice(X.shape[0], sample_rows, replace=False))
+    if importance_type == 'shap':
+        X_sample = find_rows_of_X(rows, bst_start)
+        contribs = bst.predict(xgb.DMatrix(X_sample, feature_names=cols), pred_contribs=True)
+        ### the last column is the bias. Multi-class contributions have one set per class ###
+        contribs = np.abs(contribs[..., :-1])
+        shap_values = contribs.reshape(-1, len(cols)).mean(axis=0)*(contribs.shape[1] if contribs.ndim == 3 else 1)
+        return dict([(col, float(value)) for col, value in zip(cols, shap_values)
+                        if col in gain_feats and col in feature_names[start:]])
+    def find_loss(margin, y_true):
+        if modeltype == 'Regression':
+            return ((margin - y_true)**2).mean(axis=-1)
+        elif modeltype == 'Binary_Classification':
+            proba = np.clip(1/(1+np.exp(-margin)), 1e-15, 1-1e-15)
+            return -(y_true*np.log(proba) + (1-y_true)*np.log(1-proba)).mean(axis=-1)
+        else:
+            margin = margin - margin.max(axis=-1, keepdims=True)
+            log_proba = margin - np.log(np.exp(margin).sum(axis=-1, keepdims=True))
+            return -np.take_along_axis(log_proba, y_true.astype(int)[..., None], axis=-1)[..., 0].mean(axis=-1)
+    if params is None:
+        folds = [(bst, rows)]
+    else:
+        cols = feature_names[start:]
+        #### cross-fitting: each half of the rows is scored by a booster trained on the other half ####
+        shuffled = np.random.RandomState(99).permutation(X.shape[0])
+        halves = [shuffled[:X.shape[0]//2], shuffled[X.shape[0]//2:]]
+        folds = []
+        for k in range(2):
+            fit_rows = np.sort(halves[1-k][:max_fit_rows])
+            dfit = xgb.DMatrix(find_rows_of_X(fit_rows, start), label=y[fit_rows], feature_names=cols,
+                            weight=None if weight is None else np.asarray(weight)[fit_rows])
+            folds.append((xgb.train(params, dfit, num_boost_round=num_rounds),
+                          np.sort(halves[k][:sample_rows//2])))
+            dfit = None
+    used = [position for position, col in enumerate(cols) if col in gain_feats and col in feature_names[start:]]
+    ### each feature is shuffled n_repeats times: every (feature, shuffle) pair is one copy of the sample ###
+    copies = [(position, repeat) for position in used for repeat in range(n_repeats)]
+    increases = dict([(position, []) for position in used])
+    base_losses = []
+    rng = np.random.RandomState(42)
+    for fold_bst, rows in folds:
+        X_sample, y_sample = find_rows_of_X(rows, len(feature_names) - len(cols)), y[rows]
+        n_rows = X_sample.shape[0]
+        base_loss = find_loss(fold_bst.predict(xgb.DMatrix(X_sample, feature_names=cols), output_margin=True),
+                              y_sample)
+        base_losses.append(base_loss)
+        shuffled_rows = [rng.permutation(n_rows) for repeat in range(n_repeats)]
+        batch_size = max(1, int(max_cells/max(1, n_rows*len(cols))))
+        for batch_start in range(0, len(copies), batch_size):
+            batch = copies[batch_start:batch_start+batch_size]
+            X_batch = np.tile(X_sample, (len(batch), 1))
+            for k, (position, repeat) in enumerate(batch):
+                X_batch[k*n_rows:(k+1)*n_rows, position] = X_sample[shuffled_rows[repeat], position]
+            margin = fold_bst.predict(xgb.DMatrix(X_batch, feature_names=cols), output_margin=True)
+            margin = margin.reshape((len(batch), n_rows) + margin.shape[1:])
+            losses = find_loss(margin, np.broadcast_to(y_sample, (len(batch), n_rows)))
+            for (position, repeat), loss in zip(batch, losses):
+                increases[position].append(loss - base_loss)
+    base_loss = np.mean(base_losses)
+    imp_feats = {}
+    for position in used:
+        mean_increase, spread = np.mean(increases[position]), np.std(increases[position])
+        if mean_increase > spread and mean_increase > min_loss_increase*base_loss:
+            imp_feats[cols[position]] = float(mean_increase)
+        else:
+            imp_feats[cols[position]] = 0.0
+    return imp_feats
+###################################################################################
+def find_stable_sample_rows(X, y, feature_names, start, params, top_num, modeltype='Regression',
+                            start_rows=100000, tree_method='hist', min_jaccard=0.9):
+    """
+    Finds a sample of rows on which the top features of XGBoost have settled. It trains on the
+    columns X[:, start:] of a random sample of start_rows rows and doubles the sample until the
+    top_num features (by gain) of two samples in a row have a Jaccard similarity of min_jaccard
+    or more. Each sample holds the smaller ones, and for classification every sample is stratified.
+    Returns the sorted row numbers of the last sample, or None if all the rows are needed.
+    """
+    y = np.asarray(y).ravel()
+    n_rows = X.shape[0]
+    rng = np.random.RandomState(99)
+    if modeltype == 'Regression':
+        order = rng.permutation(n_rows)
+    else:
+        ### the rows of each class are spread evenly along the order: so each prefix is stratified ###
+        rank = np.zeros(n_rows)
+        for each_class in np.unique(y):
+            members = rng.permutation(np.flatnonzero(y == each_class))
+            rank[members] = (np.arange(len(members)) + rng.uniform(size=len(members)))/len(members)
+        order = np.argsort(rank, kind='mergesort')
+    top_num = max(1, top_num)
+    sample_rows = int(start_rows)
+    previous_top = None
+    ### a sample bigger than half the rows saves little over training on all of them ###
+    while sample_rows <= n_rows//2:
+        rows = np.sort(order[:sample_rows])
+        if isinstance(X, pd.DataFrame):
+            X_sample = X.iloc[rows, start:]
+        else:
+            X_sample = X[rows, start:]
+        if modeltype == 'Multi_Classification':
+            weight = get_sample_weight_array(y[rows])
+        else:
+            weight = None
+        dtrain = build_feature_selection_matrix(X_sample, y[rows], feature_names[start:], tree_method,
+                                                weight=weight)
+        ### the same number of boosting rounds as the recursive rounds use for this many rows ###
+        bst = xgb.train(params, dtrain, num_boost_round=20 if sample_rows >= 100000 else 100)
+        imp_feats = pd.Series(bst.get_score(importance_type='gain')).sort_values(ascending=False)
+        top_feats = set(imp_feats[:top_num].index)
+        if previous_top is not None:
+            jaccard = len(top_feats & previous_top)/max(1, len(top_feats | previous_top))
+            if jaccard >= min_jaccard:
+                print('    Top %d features on %d and %d rows agree (Jaccard %0.2f). Using a sample of %d rows of %d' %(
+                                top_num, sample_rows//2, sample_rows, jaccard, sample_rows, n_rows))
+                return rows
+            print('    Top %d features on %d and %d rows do not agree (Jaccard %0.2f). Doubling sample...' %(
+                                top_num, sample_rows//2, sample_rows, jaccard))
+        previous_top = top_feats
+        sample_rows *= 2
+    print('    Top features did not settle on samples of rows. Using all %d rows' %n_rows)
+    return None
+###################################################################################
+def train_xgboost_with_early_stopping(X, y, feature_names, start, params, early_stopping_rounds,
+                            modeltype='Regression', tree_method='hist', weight=None,
+                            max_num_rounds=500, holdout=0.2):
+    """
+    Trains the XGBoost model of the first recursive round on the columns X[:, start:] with a random
+    holdout of rows for early stopping. Boosting stops once the holdout score has not improved for
+    early_stopping_rounds boosting rounds (or at max_num_rounds).
+    Returns the booster cut at its best boosting round and that number of boosting rounds.
+    """
+    y = np.asarray(y).ravel()
+    rows = np.random.RandomState(99).permutation(X.shape[0])
+    n_holdout = max(1, int(X.shape[0]*holdout))
+    holdout_rows, train_rows = np.sort(rows[:n_holdout]), np.sort(rows[n_holdout:])
+    if isinstance(X, pd.DataFrame):
+        X_train, X_holdout = X.iloc[train_rows, start:], X.iloc[holdout_rows, start:]
+    else:
+        X_train, X_holdout = X[train_rows, start:], X[holdout_rows, start:]
+    if weight is None:
+        train_weight = holdout_weight = None
+    else:
+        weight = np.asarray(weight)
+        train_weight, holdout_weight = weight[train_rows], weight[holdout_rows]
+    dtrain = build_feature_selection_matrix(X_train, y[train_rows], feature_names[start:], tree_method,
+                            weight=train_weight)
+    dholdout = xgb.DMatrix(X_holdout, label=y[holdout_rows], weight=holdout_weight,
+                            feature_names=feature_names[start:])
+    params = copy.deepcopy(params)
+    ### a smooth metric: the default error rate of multi:softmax changes in coarse steps ###
+    if modeltype == 'Regression':
+        params['eval_metric'] = 'rmse'
+    elif modeltype == 'Binary_Classification':
+        params['eval_metric'] = 'logloss'
+    else:
+        params['eval_metric'] = 'mlogloss'
+    bst = xgb.train(params, dtrain, num_boost_round=max_num_rounds, evals=[(dholdout, 'holdout')],
+                    early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+    best_num_rounds = bst.best_iteration + 1
+    return bst[:best_num_rounds], best_num_rounds
+###################################################################################
+def train_xgboost_rounds_in_parallel(X, y, feature_names, starts, params, num_rounds,
+                            tree_method='hist', n_jobs=-1, nthread=None, weight=None):
+    """
+    Trains the XGBoost models of the recursive rounds at the same time in a pool of threads.
+    XGBoost releases the GIL while it trains, so the threads run in parallel. The round that
+    starts at column start trains on the columns X[:, start:] with its own DMatrix.
+    n_jobs is the number of rounds trained at once (-1 means all of them) and nthread is the
+    number of XGBoost threads of each round. None splits the cpu's evenly among the rounds.
+    Returns a dictionary of each start and its booster.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    n_cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = len(starts)
+    n_jobs = max(1, min(n_jobs, len(starts)))
+    if nthread is None:
+        nthread = max(1, n_cpus//n_jobs)
+    round_params = copy.deepcopy(params)
+    round_params['nthread'] = nthread
+    print('    Training %d XGBoost rounds, %d at a time with %d threads each...' %(len(starts), n_jobs, nthread))
+    def train_round(start):
+        if isinstance(X, pd.DataFrame):
+            X_round = X.iloc[:, start:]
+        else:
+            X_round = X[:, start:]
+        dtrain = build_feature_selection_matrix(X_round, y, feature_names[start:], tree_method, weight=weight)
+        return xgb.train(round_params, dtrain, num_boost_round=num_rounds)
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        boosters = list(pool.map(train_round, starts))
+    return dict(zip(starts, boosters))
+###################################################################################
+def find_feature_window_params(dtrain, params, start):
+    """
+    Restricts training on dtrain to its columns from start onwards without building a new DMatrix.
+    The columns before start get a feature weight of zero and colsample_bytree keeps exactly the
+    number of columns left. So every tree samples all of those columns and none of the others.
+    Returns a copy of params with colsample_bytree set.
+    """
+    n_features = dtrain.num_col()
+    feature_weights = np.ones(n_features)
+    feature_weights[:start] = 0
+    dtrain.set_info(feature_weights=feature_weights)
+    params = copy.deepcopy(params)
+    if start > 0:
+        ### xgboost truncates colsample_bytree*n_features: the extra half guards against float error ###
+        params['colsample_bytree'] = (n_features - start + 0.5)/n_features
+    return params
+###################################################################################
 def draw_feature_importances_multi_label(bst_models, dask_xgboost_flag=False):
     rows = int(len(bst_models)/2 + 0.5)
     colus = 2
@@ -1573,56 +2431,157 @@ def draw_feature_importances_single_label(bst_models, dask_xgboost_flag=False):
             counter += 1
     plt.show();
 ######################################################################################
-def reduce_mem_usage(df):
+def find_smallest_dtype(col_type, c_min, c_max, float_types=[np.float32]):
+    """
+    Returns the smallest numpy dtype of the same kind (int or float) as col_type that can
+    hold all values between c_min and c_max. Returns None if it is not an int or float type.
+    Floats are only downcast to the types in float_types. float16 is left out by default
+    since it destroys precision and is slow on CPUs (most kernels upcast it back anyway).
+    Nullable pandas dtypes such as Int64 and Float64 are not numpy dtypes: they return None too.
+    """
+    if pd.api.types.is_extension_array_dtype(col_type):
+        return None
+    if np.issubdtype(col_type, np.integer):
+        for each_type in [np.int8, np.int16, np.int32, np.int64]:
+            if c_min > np.iinfo(each_type).min and c_max < np.iinfo(each_type).max:
+                return np.dtype(each_type)
+        return np.dtype(np.int64)
+    elif np.issubdtype(col_type, np.floating):
+        for each_type in float_types:
+            if c_min > np.finfo(each_type).min and c_max < np.finfo(each_type).max:
+                return np.dtype(each_type)
+        return np.dtype(np.float64)
+    return None
+##################################################################################
+def find_max_relative_error(values, new_type):
+    """
+    Returns the max relative error when the values of a float column are cast to new_type.
+    Zeros, NaNs and infinities are ignored since their relative error is not defined.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values) & (values != 0)]
+    if len(values) == 0:
+        return 0.0
+    cast_values = values.astype(new_type).astype(np.float64)
+    return float(np.nanmax(np.abs(cast_values - values) / np.abs(values)))
+##################################################################################
+def find_min_max_of_columns(df, cols):
+    """
+    Finds the min and max of all columns in one aggregate pass instead of one pass per column.
+    Works on both pandas and dask dataframes. Returns two pandas Series indexed by column.
+    """
+    c_mins = df[cols].min()
+    c_maxs = df[cols].max()
+    if type(df) == dask.dataframe.core.DataFrame:
+        c_mins, c_maxs = dask.compute(c_mins, c_maxs)
+    return c_mins, c_maxs
+##################################################################################
+def find_dtype_plan(df, float_error_limit=None, sample_rows=10000, verbose=0):
+    """
+    This finds the smallest dtype for each column in a dataframe and returns it as a dtype plan.
+    A dtype plan is just a dictionary of column names and dtypes. The min and max of all numeric
+    columns are found in a single aggregate pass (even for dask dataframes) instead of twice per column.
+    Integer columns get the smallest int type and object columns become category.
+    Float columns become float32 by default if their range fits. If you set a float_error_limit
+    (a max relative error such as 0.001), each float column gets the narrowest of float16, float32
+    and float64 whose max relative error on a sample of rows is within that limit.
+    Other columns (including nullable Int64 and Float64 columns) are left out of the plan. If verbose, it prints the bytes saved and the
+    max relative error for each column.
+    You can save the plan and apply it to test data or future batches using apply_dtype_plan.
+    """
+    num_cols = [col for col in df.select_dtypes(include=['integer', 'floating']).columns
+                    if not pd.api.types.is_extension_array_dtype(df[col].dtype)]
+    obj_cols = df.select_dtypes(include='object').columns.tolist()
+    float_cols = [col for col in df.select_dtypes(include='floating').columns if col in num_cols]
+    if float_error_limit is None:
+        float_types = [np.float32]
+    else:
+        float_types = [np.float16, np.float32]
+    if len(float_cols) > 0:
+        ### relative errors are measured on a small sample of rows only ###
+        sample = df[float_cols].head(sample_rows)
+    dtype_plan = {}
+    max_errors = {}
+    if len(num_cols) > 0:
+        c_mins, c_maxs = find_min_max_of_columns(df, num_cols)
+        for col in num_cols:
+            new_type = find_smallest_dtype(df[col].dtype, c_mins[col], c_maxs[col], float_types)
+            if new_type is None:
+                continue
+            if col in float_cols:
+                max_errors[col] = find_max_relative_error(sample[col], new_type)
+                if float_error_limit is not None:
+                    while new_type != np.float64 and max_errors[col] > float_error_limit:
+                        new_type = np.dtype(np.float32) if new_type == np.float16 else np.dtype(np.float64)
+                        max_errors[col] = find_max_relative_error(sample[col], new_type)
+            dtype_plan[col] = new_type
+    for col in obj_cols:
+        dtype_plan[col] = 'category'
+    if verbose:
+        nrows = len(df)
+        report = pd.DataFrame([(col, str(df[col].dtype), str(dtype),
+                    int((df[col].dtype.itemsize - np.dtype(dtype).itemsize)*nrows) if col in num_cols else np.nan,
+                    max_errors.get(col, 0.0)) for (col, dtype) in dtype_plan.items()],
+                    columns=['column', 'old_dtype', 'new_dtype', 'bytes_saved', 'max_relative_error'])
+        print('    dtype plan for reducing memory (max relative error measured on %d rows):' %min(nrows, sample_rows))
+        print(report.to_string(index=False))
+    return dtype_plan
+##################################################################################
+def apply_dtype_plan(df, dtype_plan, check_ranges=True):
+    """
+    This applies a dtype plan from find_dtype_plan to a dataframe by casting all columns in one
+    bulk astype call. Columns in the plan that are not in the dataframe are ignored.
+    When check_ranges is True (which is what you want for test data and future batches),
+    the min and max of the new data are found in one pass and any column whose values do not
+    fit into the planned dtype is widened instead, so that values never overflow. Columns whose
+    kind has changed (say from int to float due to missing values) are left as they are.
+    """
+    cast_plan = dict([(col, dtype) for (col, dtype) in dtype_plan.items() if col in df.columns])
+    num_cols = [col for (col, dtype) in cast_plan.items() if str(dtype) != 'category']
+    for col in num_cols:
+        cast_plan[col] = np.dtype(cast_plan[col])
+    if check_ranges and len(num_cols) > 0:
+        c_mins, c_maxs = find_min_max_of_columns(df, num_cols)
+        for col in num_cols:
+            needed_type = find_smallest_dtype(df[col].dtype, c_mins[col], c_maxs[col])
+            if needed_type is None or needed_type.kind != cast_plan[col].kind:
+                cast_plan.pop(col)
+            else:
+                cast_plan[col] = np.promote_types(cast_plan[col], needed_type)
+    try:
+        df = df.astype(cast_plan)
+    except:
+        for col, dtype in cast_plan.items():
+            try:
+                df[col] = df[col].astype(dtype)
+            except:
+                continue
+    return df
+##################################################################################
+def reduce_mem_usage(df, dtype_plan=None, return_plan=False, float_error_limit=None, verbose=0):
     """
     #####################################################################
     Greatly indebted to :
     https://www.kaggle.com/arjanso/reducing-dataframe-memory-size-by-65
         for this function to reduce memory usage.
     #####################################################################
-    It is a bit slow as it iterates through all the columns of a dataframe and modifies data types
-        to reduce memory usage. But it has been shown to reduce memory usage by 65% or so.       
+    It finds the min and max of all columns in one pass, builds a dtype plan and applies it
+    in one bulk cast. It has been shown to reduce memory usage by 65% or so.
+    If you send in a dtype_plan (say the one found on train data), that plan is applied
+    instead, after making sure the values in this data fit into the planned dtypes.
+    If return_plan is True, it returns a tuple of the dataframe and the dtype plan it used.
+    Floats are downcast to float32 by default. Set float_error_limit to a max relative error
+    (such as 0.001) to let it pick float16 where the error on a sample stays within that limit.
     """
     start_mem = df.memory_usage().sum() / 1024**2
     if type(df) == dask.dataframe.core.DataFrame:
         start_mem = start_mem.compute()
     print('    Caution: We will try to reduce the memory usage of dataframe from {:.2f} MB'.format(start_mem))
-    cols = df.columns
-    if type(df) == dask.dataframe.core.DataFrame:
-        cols = cols.tolist()
-
-    for col in cols:
-        col_type = df[col].dtype
-        if col_type != object:
-            try:
-                c_min = df[col].min()
-                c_max = df[col].max()
-            except:
-                continue
-            if type(df) == dask.dataframe.core.DataFrame:
-                c_min = c_min.compute()
-                c_max = c_max.compute()
-            if str(col_type)[:3] == 'int':
-                if c_min > np.iinfo(np.int8).min and c_max < np.iinfo(np.int8).max:
-                    df[col] = df[col].astype(np.int8)
-                elif c_min > np.iinfo(np.int16).min and c_max < np.iinfo(np.int16).max:
-                    df[col] = df[col].astype(np.int16)
-                elif c_min > np.iinfo(np.int32).min and c_max < np.iinfo(np.int32).max:
-                    df[col] = df[col].astype(np.int32)
-                elif c_min > np.iinfo(np.int64).min and c_max < np.iinfo(np.int64).max:
-                    df[col] = df[col].astype(np.int64)  
-            else:
-                try:
-                    if c_min > np.finfo(np.float16).min and c_max < np.finfo(np.float16).max:
-                        df[col] = df[col].astype(np.float16)
-                    elif c_min > np.finfo(np.float32).min and c_max < np.finfo(np.float32).max:
-                        df[col] = df[col].astype(np.float32)
-                    else:
-                        df[col] = df[col].astype(np.float64)
-                except:
-                    continue
-        else:
-            df[col] = df[col].astype('category')
+    if dtype_plan is None:
+        dtype_plan = find_dtype_plan(df, float_error_limit=float_error_limit, verbose=verbose)
+        df = apply_dtype_plan(df, dtype_plan, check_ranges=False)
+    else:
+        df = apply_dtype_plan(df, dtype_plan, check_ranges=True)
 
     #######  Results after memory usage function ###################
     end_mem = df.memory_usage().sum() / 1024**2
@@ -1630,7 +2589,8 @@ def reduce_mem_usage(df):
         end_mem = end_mem.compute()
     print('        memory usage after optimization is: {:.2f} MB'.format(end_mem))
     print('        decreased by {:.1f}%'.format(100 * (start_mem - end_mem) / start_mem))
-    
+    if return_plan:
+        return df, dtype_plan
     return df
 ##################################################################################
 def FE_start_end_date_time_features(smalldf, startTime, endTime, splitter_date_string="/",splitter_hour_string=":"):
@@ -2836,8 +3796,9 @@ def FE_convert_mixed_datatypes_to_string(df):
                 print('    could not change column type. Fix it manually and then re-run EDA.')
     return df
 ##################################################################################
-def remove_duplicate_cols_in_dataset(df):
-    df = copy.deepcopy(df)
+def remove_duplicate_cols_in_dataset(df, make_copy=True):
+    if make_copy:
+        df = copy.deepcopy(df)
     number_duplicates = df.columns.duplicated().astype(int).sum()
     duplicates = df.columns[df.columns.duplicated()]
     if  number_duplicates > 0:
@@ -2881,7 +3842,7 @@ def FE_split_list_into_columns(df, col, cols_in=[]):
 #############################################################################################
 def EDA_randomly_select_rows_from_dataframe(train_dataframe, targets, nrows_limit, DS_LEN=''):
     maxrows = 10000
-    train_dataframe = copy.deepcopy(train_dataframe)
+    ### train_dataframe is only read here: the sample is always a new dataframe ###
     copy_targets = copy.deepcopy(targets)
     if not DS_LEN:
         DS_LEN = train_dataframe.shape[0]
@@ -2897,7 +3858,8 @@ def EDA_randomly_select_rows_from_dataframe(train_dataframe, targets, nrows_limi
         for each_target in copy_targets:
             ### You need to remove rows that have very class samples - that is a problem while splitting train_small
             list_of_few_classes = train_dataframe[each_target].value_counts()[train_dataframe[each_target].value_counts()<=3].index.tolist()
-            train_dataframe = train_dataframe.loc[~(train_dataframe[each_target].isin(list_of_few_classes))]
+            if len(list_of_few_classes) > 0:
+                train_dataframe = train_dataframe.loc[~(train_dataframe[each_target].isin(list_of_few_classes))]
         try:
             train_small, _ = train_test_split(train_dataframe, test_size=test_size, stratify=train_dataframe[targets])
         except:
@@ -2906,7 +3868,7 @@ def EDA_randomly_select_rows_from_dataframe(train_dataframe, targets, nrows_limi
     else:
         ### For Regression problems: load a small sample of data into a pandas dataframe ##
         print('    loading a sequential sample of %d rows into pandas for EDA' %nrows_limit)
-        train_small = train_dataframe[:nrows_limit]
+        train_small = train_dataframe[:nrows_limit].copy()
     return train_small
 ################################################################################################
 class FeatureWiz(BaseEstimator, TransformerMixin):
@@ -996,13 +996,15 @@ def _create_ts_features(df, tscol, verbose=0):
 ################################################################
 from dateutil.relativedelta import relativedelta
 from datetime import date
+from .classify_method import convert_to_datetime
 ##### This is a little utility that computes age from year ####
 def compute_age(year_string):
     today = date.today()
     age = relativedelta(today, year_string)
     return age.years
 #################################################################
-def FE_create_time_series_features(dft, ts_column, ts_adds_in=[], verbose=0):
+def FE_create_time_series_features(dft, ts_column, ts_adds_in=[], verbose=0, make_copy=True,
+                                   date_format=None):
     """
     FE stands for FEATURE ENGINEERING - That means this function will create new features!
     #######        B E W A R E  : H U G E   N U M B E R   O F  F E A T U R E S  ###########
@@ -1017,6 +1019,11 @@ def FE_create_time_series_features(dft, ts_column, ts_adds_in=[], verbose=0):
     dtf: pandas DataFrame
     ts_column: name of the time series column
     ts_adds_in: list of time series columns you want in the returned dataframe.
+    make_copy: default is True. Set it to False to add the new features to dtf in place.
+            Use this only if you own dtf since it will be modified.
+    date_format: default is None. The date time format of ts_column such as '%d/%m/%Y'.
+            featurewiz passes the format it found while classifying features. If it is None
+            or does not fit all the values, pandas infers the format.
 
     Outputs:
     dtf: The original pandas dataframe with new fields created by splitting date-time field
@@ -1024,7 +1031,10 @@ def FE_create_time_series_features(dft, ts_column, ts_adds_in=[], verbose=0):
                  This list of columns is useful for matching test with train dataframes.
     ######################################################################################
     """
-    dtf = copy.deepcopy(dft)
+    if make_copy:
+        dtf = copy.deepcopy(dft)
+    else:
+        dtf = dft
     reset_index = False
     if not ts_adds_in:
         # ts_column = None assumes that that index is the time series index
@@ -1061,15 +1071,15 @@ def FE_create_time_series_features(dft, ts_column, ts_adds_in=[], verbose=0):
                 ts_adds = []
             else:
                 ### if it is not a year alone, then convert it into a date time variable
-                dtf[ts_column] = pd.to_datetime(dtf[ts_column], infer_datetime_format=True)
+                dtf[ts_column] = convert_to_datetime(dtf[ts_column], date_format)
                 ### this is where you create the time series features #####
                 dtf, ts_adds = _create_ts_features(df=dtf, tscol=ts_column)
         else:
-            dtf[ts_column] = pd.to_datetime(dtf[ts_column], infer_datetime_format=True)
+            dtf[ts_column] = convert_to_datetime(dtf[ts_column], date_format)
             ### this is where you create the time series features #####
             dtf, ts_adds = _create_ts_features(df=dtf, tscol=ts_column)
     else:
-        dtf[ts_column] = pd.to_datetime(dtf[ts_column], infer_datetime_format=True)
+        dtf[ts_column] = convert_to_datetime(dtf[ts_column], date_format)
         ### this is where you create the time series features #####
         dtf, ts_adds = _create_ts_features(df=dtf, tscol=ts_column)
     ####### This is where we make sure train and test have the same number of columns ####
@@ -1515,7 +1525,7 @@ class TS_Fourier_Transformer_Pipe(BaseEstimator, TransformerMixin):
 ###########################################################################################
 ############## CONVERSION OF STRING COLUMNS TO NUMERIC using MY_LABELENCODER #########
 #######################################################################################
-def FE_convert_all_object_columns_to_numeric(train, test="", features=[]):
+def FE_convert_all_object_columns_to_numeric(train, test="", features=[], make_copy=True):
     """
     FE stands for Feature Engineering - it means this function performs feature engineering
     ######################################################################################
@@ -1527,15 +1537,18 @@ def FE_convert_all_object_columns_to_numeric(train, test="", features=[]):
     Inputs:
     train : pandas dataframe
     test: (optional) pandas dataframe
+    features: (optional) list of features to convert. Default is all columns in train.
+    make_copy: default is True. Set it to False if you own train and test and don't need them
+            anymore: they are then converted in place which saves a full copy of each in memory.
 
     Outputs:
     train: this is the transformed DataFrame
     test: (optional) this is the transformed test dataframe if given.
     ######################################################################################
     """
-    
-    train = copy.deepcopy(train)
-    test = copy.deepcopy(test)
+    if make_copy:
+        train = copy.deepcopy(train)
+        test = copy.deepcopy(test)
     #### This is to fill all numeric columns with a missing number ##########
     nums = train.select_dtypes('number').columns.tolist()
     if len(features) == 0:
@@ -1928,7 +1941,7 @@ class Column_Names_Transformer(BaseEstimator, TransformerMixin):
         self.transformed_flag = False
         
     def fit(self, X):
-        X = copy.deepcopy(X)
+        ### fit only reads the column names of X: so X is not copied ###
         ### Now you can check if the parts of tuple are dataframe series, etc.
         if isinstance(X, tuple):
             y = X[1]
@@ -19,6 +19,10 @@ import logging
 import pdb
 import copy
 import time
+import os
+import tempfile
+import contextlib
+import hashlib
 from sklearn.feature_selection import chi2, mutual_info_regression, mutual_info_classif
 from sklearn.feature_selection import SelectKBest
 from itertools import combinations
@@ -28,8 +32,11 @@ import matplotlib.pyplot as plt
 from collections import defaultdict
 from collections import OrderedDict
 import time
+from .classify_method import find_results_in_shards
 #################################################################################
 def left_subtract(l1,l2):
+    ### a set makes each lookup O(1): this is called on lists of thousands of vars ###
+    l2 = set(l2)
     lst = []
     for i in l1:
         if i not in l2:
@@ -55,9 +62,476 @@ def find_remove_duplicates(list_of_values):
             output.append(value)
             seen.add(value)
     return output
+#################################################################################
+def create_numeric_working_set(df, cols, scratch_dir=None, order='C', fill_value=None):
+    """
+    This builds one contiguous float32 array holding the given numeric columns of a dataframe.
+    Any set of adjacent columns of this array is a zero-copy (strided) view that can be sent
+    straight into xgb.DMatrix. This way the numeric block is copied only once instead of once
+    for every recursive XGBoost round. The array is row-major by default since XGBoost reads
+    dense data row by row: it builds a DMatrix faster from row-major views than column-major ones.
+    Columns are copied in one by one so that no float64 copy of the whole frame is made.
+
+    Inputs:
+    df: pandas dataframe
+    cols: list of numeric columns in df to copy into the working set
+    scratch_dir: default is None. If a directory is given, the working set is written to a
+            memory-mapped .npy file in it instead of RAM. Use this when the data is bigger than RAM.
+    order: 'C' for row-major (best for XGBoost) or 'F' for column-major (best for reading columns).
+    fill_value: default is None. If given, missing values are replaced by it.
+
+    Outputs:
+    X: a float32 numpy array or np.memmap of shape (len(df), len(cols))
+    """
+    if scratch_dir:
+        os.makedirs(scratch_dir, exist_ok=True)
+        handle, filename = tempfile.mkstemp(prefix='featurewiz_', suffix='.npy', dir=scratch_dir)
+        os.close(handle)
+        try:
+            X = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32,
+                        shape=(df.shape[0], len(cols)), fortran_order=(order == 'F'))
+        except:
+            os.remove(filename)
+            raise
+    else:
+        X = np.empty((df.shape[0], len(cols)), dtype=np.float32, order=order)
+    try:
+        for i, col in enumerate(cols):
+            X[:, i] = df[col].values
+            if fill_value is not None:
+                column = X[:, i]
+                column[np.isnan(column)] = fill_value
+    except:
+        ### a column that is not numeric must not leave a scratch file behind ###
+        delete_numeric_working_set(X)
+        raise
+    return X
+#################################################################################
+def delete_numeric_working_set(X):
+    """
+    Removes the scratch file of a memory-mapped working set. It does nothing for in-memory arrays.
+    On posix systems the mapping stays readable until X is garbage collected.
+    """
+    if isinstance(X, np.memmap) and X.filename is not None:
+        try:
+            os.remove(X.filename)
+        except OSError:
+            ### Windows does not allow removing a file that is still mapped ###
+            pass
+#################################################################################
+def create_numeric_frame(df, numvars, scratch_dir=None):
+    """
+    Returns the numvars of df as a new dataframe with missing values filled with 0, and the
+    working set behind it. If a scratch_dir is given, the dataframe is a zero-copy view of a
+    column-major memory-mapped working set (mutual information reads one column at a time).
+    Otherwise the working set is None. Remove it with delete_numeric_working_set when done.
+    """
+    if scratch_dir:
+        X_working_set = create_numeric_working_set(df, numvars, scratch_dir=scratch_dir,
+                                    order='F', fill_value=0)
+        df = pd.DataFrame(X_working_set, columns=numvars, index=df.index, copy=False)
+    else:
+        X_working_set = None
+        ### selecting numvars already gives a new dataframe. Hence df is never modified here.
+        df = df[numvars]
+        ### for some reason, doing a mass fillna of vars doesn't work! Hence doing it individually!
+        null_vars = np.array(numvars)[df.isnull().sum()>0]
+        for each_num in null_vars:
+            df[each_num] = df[each_num].fillna(0)
+    return df, X_working_set
+#################################################################################
+def limit_blas_threads(n_jobs=None):
+    """
+    Returns a context manager that limits the number of threads numpy's BLAS uses for matrix
+    multiplies to n_jobs. -1 means all the cpu's. None leaves BLAS with its default threads.
+    It needs the threadpoolctl library. If that is not installed, BLAS is left as is.
+    """
+    if n_jobs is None:
+        return contextlib.nullcontext()
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        print('    threadpoolctl is not installed. Hence BLAS threads cannot be set. Continuing...')
+        return contextlib.nullcontext()
+    if n_jobs < 0:
+        n_jobs = max(1, os.cpu_count() + 1 + n_jobs)
+    return threadpool_limits(limits=n_jobs, user_api='blas')
+#################################################################################
+def find_scaled_block(df, cols, positions, rows, means, norms):
+    """
+    Returns the rows of the columns at positions in cols as a float64 array that is centered
+    and scaled the same way as the working set Z of find_correlated_pairs_in_blocks.
+    """
+    block = df[[cols[i] for i in positions]].iloc[rows].values.astype(np.float64)
+    return (block - means[positions])/np.where(norms[positions] > 0, norms[positions], 1)
+#################################################################################
+def find_correlated_pairs_in_blocks(df, cols, corr_limit, block_cols=1000, block_rows=10000,
+                                    scratch_dir=None, margin=1e-3, n_jobs=None):
+    """
+    Finds the pairs of columns whose absolute Pearson correlation is at least corr_limit without
+    ever building the full correlation matrix. The columns are centered and scaled once into a
+    float32 working set Z so that Z.T @ Z is the correlation matrix. It is found one tile of
+    block_cols x block_cols columns at a time (summing over blocks of block_rows rows) and only
+    the pairs above corr_limit are kept from each tile. Memory grows with the number of correlated
+    pairs instead of the square of the number of columns.
+    Pairs that pass the threshold in float32 (less a small margin for float32 rounding) are found
+    again in float64 from df with one more matrix multiply per tile, over only the rows and columns
+    of that tile that have such pairs. So the coefficients are the same as df.corr() to 7 decimals.
+
+    Inputs:
+    df: pandas dataframe without missing values
+    cols: list of numeric columns in df
+    corr_limit: pairs with absolute correlation at or above this limit are returned
+    scratch_dir: default is None. If a directory is given, Z is a memory-mapped file in it.
+    n_jobs: default is None. Number of BLAS threads for the matrix multiplies. -1 means all cpu's.
+
+    Outputs:
+    corrdf: dataframe with columns var1, var2 and coeff (the absolute correlation rounded to 7
+        decimals) with one row per correlated pair, sorted from lowest to highest coeff.
+    """
+    n_rows, n_cols = df.shape[0], len(cols)
+    Z = create_numeric_working_set(df, cols, scratch_dir=scratch_dir, order='F')
+    means = np.zeros(n_cols)
+    norms = np.zeros(n_cols)
+    pairs_i, pairs_j, coeffs = [], [], []
+    ### the scratch file of Z is removed even if finding the pairs fails ###
+    try:
+        for i, col in enumerate(cols):
+            centered = df[col].values.astype(np.float64)
+            means[i] = centered.mean()
+            centered -= means[i]
+            norms[i] = np.sqrt(np.dot(centered, centered))
+            ### constant columns have no correlation (df.corr() gives NaN): so they are set to zero ###
+            Z[:, i] = centered/norms[i] if norms[i] > 0 else 0
+        with limit_blas_threads(n_jobs):
+            for start_i in range(0, n_cols, block_cols):
+                for start_j in range(start_i, n_cols, block_cols):
+                    tile = np.zeros((min(block_cols, n_cols-start_i), min(block_cols, n_cols-start_j)))
+                    for start_row in range(0, n_rows, block_rows):
+                        rows = slice(start_row, start_row+block_rows)
+                        tile += np.dot(Z[rows, start_i:start_i+block_cols].T, Z[rows, start_j:start_j+block_cols])
+                    found_i, found_j = np.nonzero(np.abs(tile) >= corr_limit - margin)
+                    found_i, found_j = found_i + start_i, found_j + start_j
+                    ### only the upper triangle of the tiles on the diagonal is needed ###
+                    upper = found_i < found_j
+                    found_i, found_j = found_i[upper], found_j[upper]
+                    if len(found_i) == 0:
+                        continue
+                    ### the candidates of this tile are found again in float64 ###
+                    rows_i, cols_j = np.unique(found_i), np.unique(found_j)
+                    tile = np.zeros((len(rows_i), len(cols_j)))
+                    for start_row in range(0, n_rows, block_rows):
+                        rows = slice(start_row, start_row+block_rows)
+                        block_j = find_scaled_block(df, cols, cols_j, rows, means, norms)
+                        block_i = block_j if np.array_equal(rows_i, cols_j) else find_scaled_block(
+                                        df, cols, rows_i, rows, means, norms)
+                        tile += np.dot(block_i.T, block_j)
+                    pairs_i.append(found_i)
+                    pairs_j.append(found_j)
+                    coeffs.append(tile[np.searchsorted(rows_i, found_i), np.searchsorted(cols_j, found_j)])
+    finally:
+        delete_numeric_working_set(Z)
+        Z = None
+    pairs_i = np.concatenate(pairs_i) if pairs_i else np.array([], dtype=int)
+    pairs_j = np.concatenate(pairs_j) if pairs_j else np.array([], dtype=int)
+    coeffs = np.concatenate(coeffs) if coeffs else np.array([])
+    coeffs = np.round(np.clip(np.abs(coeffs), 0, 1), 7)
+    keep = coeffs >= corr_limit
+    corrdf = pd.DataFrame({'var1': np.array(cols, dtype=object)[pairs_i[keep]],
+                        'var2': np.array(cols, dtype=object)[pairs_j[keep]], 'coeff': coeffs[keep]})
+    return corrdf.sort_values('coeff', kind='mergesort').reset_index(drop=True)
+##################################################################################
+def find_row_chunks(data, cols, chunksize=None):
+    """
+    Yields the cols of data as pandas dataframes, one chunk of rows at a time.
+    data can be a pandas dataframe (chunks of chunksize rows), a dask dataframe (one chunk per
+    partition) or an iterator of pandas dataframes such as pd.read_csv(filename, chunksize=...).
+    If chunksize is None, each chunk of a pandas dataframe holds about 10 million cells.
+    """
+    if chunksize is None:
+        chunksize = max(1, int(1e7/max(1, len(cols))))
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, data.shape[0], chunksize):
+            yield data.iloc[start:start+chunksize][cols]
+    elif hasattr(data, 'npartitions'):
+        for partition in range(data.npartitions):
+            yield data.get_partition(partition)[cols].compute()
+    else:
+        for chunk in data:
+            yield chunk[cols]
+##################################################################################
+def find_correlated_pairs_from_chunks(chunks, cols, corr_limit, n_jobs=None):
+    """
+    Finds the pairs of columns whose absolute Pearson correlation is at least corr_limit by
+    streaming over chunks of rows. Only the sufficient statistics are kept: the number of rows,
+    the column sums and the cross-products X.T @ X, all in float64. So the correlations are exact
+    over all the rows while only one chunk is in memory at a time. Each chunk is shifted by the
+    column means of the first chunk so that the cross-products do not lose precision.
+    Missing values are filled with 0 as in SULOV. It needs n_cols x n_cols x 8 bytes of memory.
+
+    Inputs:
+    chunks: an iterator of pandas dataframes (see find_row_chunks)
+    cols: list of numeric columns in each chunk
+    corr_limit: pairs with absolute correlation at or above this limit are returned
+    n_jobs: default is None. Number of BLAS threads for the matrix multiplies. -1 means all cpu's.
+
+    Outputs:
+    corrdf: dataframe with columns var1, var2 and coeff (the absolute correlation rounded to 7
+        decimals) with one row per correlated pair, sorted from lowest to highest coeff.
+    """
+    n_cols = len(cols)
+    n_rows = 0
+    shift = None
+    sums = np.zeros(n_cols)
+    cross = np.zeros((n_cols, n_cols))
+    with limit_blas_threads(n_jobs):
+        for chunk in chunks:
+            X = chunk[cols].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+            X[np.isnan(X)] = 0
+            if X.shape[0] == 0:
+                continue
+            if shift is None:
+                shift = X.mean(axis=0)
+            X -= shift
+            n_rows += X.shape[0]
+            sums += X.sum(axis=0)
+            cross += np.dot(X.T, X)
+    pairs_i, pairs_j, coeffs = np.array([], dtype=int), np.array([], dtype=int), np.array([])
+    if n_rows > 0:
+        cross -= np.outer(sums, sums)/n_rows
+        norms = np.sqrt(np.clip(np.diag(cross), 0, None))
+        ### constant columns have no correlation (df.corr() gives NaN): so they are left out ###
+        varying = norms > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross /= np.outer(norms, norms)
+        cross = np.round(np.clip(np.abs(cross), 0, 1), 7)
+        cross[~varying, :] = 0
+        cross[:, ~varying] = 0
+        pairs_i, pairs_j = np.nonzero(np.triu(cross >= corr_limit, k=1))
+        coeffs = cross[pairs_i, pairs_j]
+    corrdf = pd.DataFrame({'var1': np.array(cols, dtype=object)[pairs_i],
+                        'var2': np.array(cols, dtype=object)[pairs_j], 'coeff': coeffs})
+    return corrdf.sort_values('coeff', kind='mergesort').reset_index(drop=True)
+##################################################################################
+def find_correlation_graph(var1_list, var2_list):
+    """
+    Builds the graph of correlated pairs as CSR adjacency arrays. Each var gets a number in the
+    order in which it first appears in var1_list + var2_list and each pair is stored in both
+    directions. The neighbours of var number k are indices[indptr[k]:indptr[k+1]].
+    Returns corr_list (the vars in the order of their numbers), indptr and indices.
+    """
+    corr_list = find_remove_duplicates(var1_list + var2_list)
+    position = dict(zip(corr_list, range(len(corr_list))))
+    first = np.array([position[x] for x in var1_list], dtype=np.int64)
+    second = np.array([position[x] for x in var2_list], dtype=np.int64)
+    sources = np.concatenate([first, second])
+    targets = np.concatenate([second, first])
+    indptr = np.zeros(len(corr_list)+1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(sources, minlength=len(corr_list)))
+    indices = targets[np.argsort(sources, kind='stable')]
+    return corr_list, indptr, indices
+##################################################################################
+def select_vars_by_knockout(sorted_vars, corr_list, indptr, indices):
+    """
+    This is the SULOV knockout. It walks sorted_vars from the highest mutual information score
+    down and selects a var if it has not been knocked out yet. Then it knocks out all the vars
+    that are correlated to it using a boolean alive mask. This runs in O(V+E) time.
+    """
+    position = dict(zip(corr_list, range(len(corr_list))))
+    alive = np.ones(len(corr_list), dtype=bool)
+    selected = []
+    for var in sorted_vars:
+        k = position[var]
+        if alive[k]:
+            selected.append(var)
+            alive[indices[indptr[k]:indptr[k+1]]] = False
+    return selected
+##################################################################################
+def find_quantile_codes(values, n_bins, dtype=np.int64):
+    """
+    Returns the number of the quantile bin of each value. Equal values always get the same bin.
+    So a column with fewer than n_bins unique values gets fewer bins.
+    """
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins+1)[1:-1]))
+    return np.searchsorted(edges, values, side='right').astype(dtype, copy=False)
+##################################################################################
+def find_histogram_mutual_info(df, cols, y, discrete_target, n_bins=None, max_cells=1e7):
+    """
+    Estimates the mutual information (in nats) between each column and the target by binning
+    each column (and a continuous target) into quantile bins. The joint counts of a block of
+    columns are found with a single np.bincount and the scores of the whole block are found
+    at once. The Miller-Madow correction removes most of the upward bias of the binned estimate.
+    This is much faster than the KNN estimator on millions of rows, but it is less accurate.
+    n_bins: default is the cube root of the number of rows, between 2 and 64.
+    max_cells: each block of columns holds about max_cells codes. The codes are kept in the
+        smallest int types that fit, so memory stays a few times max_cells bytes at most.
+    """
+    n_rows = len(y)
+    if n_bins is None:
+        n_bins = int(min(64, max(2, np.cbrt(n_rows))))
+    if discrete_target:
+        y_codes = pd.factorize(np.asarray(y).ravel())[0]
+    else:
+        y_codes = find_quantile_codes(np.asarray(y, dtype=np.float64).ravel(), n_bins)
+    n_y = y_codes.max() + 1
+    block_cols = int(min(len(cols), max(1, max_cells // max(1, n_rows))))
+    ### the flat index of a joint count must fit the int type of the block #################
+    flat_dtype = np.int32 if block_cols*n_bins*n_y < np.iinfo(np.int32).max else np.int64
+    y_codes = y_codes.astype(flat_dtype)
+    scores = np.zeros(len(cols))
+    for start in range(0, len(cols), block_cols):
+        block = cols[start:start+block_cols]
+        flat = np.empty((n_rows, len(block)), dtype=flat_dtype)
+        for i, col in enumerate(block):
+            flat[:, i] = find_quantile_codes(df[col].values, n_bins, dtype=np.uint8)
+        flat *= n_y
+        flat += y_codes[:, np.newaxis]
+        flat += (np.arange(len(block), dtype=flat_dtype)*n_bins*n_y)[np.newaxis, :]
+        joint = np.bincount(flat.ravel(), minlength=len(block)*n_bins*n_y).reshape(
+                                        len(block), n_bins, n_y)/n_rows
+        flat = None
+        p_x = joint.sum(axis=2)
+        p_y = joint.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = joint*np.log(joint/(p_x[:, :, np.newaxis]*p_y[:, np.newaxis, :]))
+        mutual_info = np.nansum(terms, axis=(1, 2))
+        ### Miller-Madow: each entropy gets (number of non-empty bins - 1)/(2 * rows) added ###
+        mutual_info += ((p_x > 0).sum(axis=1) + (p_y > 0).sum(axis=1) - (joint > 0).sum(axis=(1, 2))
+                            - 1)/(2*n_rows)
+        scores[start:start+len(block)] = np.maximum(mutual_info, 0)
+    return scores
+##################################################################################
+def find_sampled_knn_mutual_info(df, cols, y, sel_function, sample_rows=5000, min_agreement=0.9):
+    """
+    Estimates the mutual information of each column with the KNN estimator (sel_function) on
+    two separate random samples of sample_rows rows. If the two rankings of the columns do not
+    agree (Spearman rank correlation below min_agreement), the samples are doubled and it tries
+    again. Once the samples would cover all the rows, it uses all the rows like the KNN method.
+    Returns the mean of the scores on the two samples.
+    """
+    from scipy.stats import spearmanr
+    n_rows = df.shape[0]
+    positions = [df.columns.get_loc(col) for col in cols]
+    y = np.asarray(y).ravel()
+    rng = np.random.RandomState(42)
+    while 2*sample_rows < n_rows:
+        rows = rng.permutation(n_rows)[:2*sample_rows]
+        scores = []
+        for half in (rows[:sample_rows], rows[sample_rows:]):
+            X = df.iloc[half, positions].values
+            scores.append(sel_function(X, y[half], n_neighbors=5, discrete_features=False, random_state=42))
+        if len(cols) < 3:
+            return (scores[0] + scores[1])/2
+        agreement = spearmanr(scores[0], scores[1])[0]
+        if np.isnan(agreement) or agreement >= min_agreement:
+            print('    mutual info ranks on two samples of %d rows agree (rank correlation %0.2f)' %(
+                                    sample_rows, agreement))
+            return (scores[0] + scores[1])/2
+        print('    mutual info ranks on two samples of %d rows do not agree (rank correlation %0.2f). Doubling samples...' %(
+                                    sample_rows, agreement))
+        sample_rows *= 2
+    return sel_function(df[cols].values, y, n_neighbors=5, discrete_features=False, random_state=42)
+##################################################################################
+#### The mutual info score of each var is cached here by the hashes of its values and target ####
+#### scores are kept until the cache holds max_mutual_info_cache scores: then the oldest go ####
+mutual_info_cache = {}
+max_mutual_info_cache = 100000
+def clear_mutual_info_cache():
+    """
+    Removes all the mutual info scores that were kept for reuse by earlier SULOV runs.
+    """
+    mutual_info_cache.clear()
+##################################################################################
+def find_values_hash(values):
+    """
+    Returns a hash of the contents of an array. Arrays with equal values get the same hash.
+    """
+    return hashlib.sha1(pd.util.hash_array(np.asarray(values).ravel()).tobytes()).hexdigest()
+##################################################################################
+def find_mutual_info_of_columns(columns, y, sel_function):
+    """
+    Finds the KNN mutual info score of each column (a 1-D array) one column at a time.
+    This is the work done by each worker process.
+    """
+    return [sel_function(column.reshape(-1, 1), y, n_neighbors=5, discrete_features=False,
+                         random_state=42)[0] for column in columns]
+##################################################################################
+def find_mutual_info_scores(df, corr_list, df_target, modeltype, mi_method='knn', n_jobs=None,
+                            per_column=False):
+    """
+    Finds the mutual info score of each var in corr_list to the target using mi_method.
+    Scores found before for the same values of a var and target are taken from mutual_info_cache.
+    If per_column is True or n_jobs is more than one, each var is scored on its own by the
+    KNN estimator (in n_jobs worker processes) instead of all vars in one call. Since the two
+    give slightly different scores, each keeps its own scores in the cache.
+    Returns a list of scores in the order of corr_list.
+    """
+    if modeltype == 'Regression':
+        sel_function = mutual_info_regression
+    else:
+        sel_function = mutual_info_classif
+    per_column = mi_method == 'knn' and (per_column or (n_jobs is not None and n_jobs != 1))
+    target_hash = find_values_hash(df_target.values)
+    cache_keys = [(find_values_hash(df[each_corr].values), target_hash, mi_method, modeltype, per_column)
+                        for each_corr in corr_list]
+    new_vars = [each_corr for each_corr, key in zip(corr_list, cache_keys) if key not in mutual_info_cache]
+    if len(new_vars) < len(corr_list):
+        print('    using cached mutual info scores of %d variables...' %(len(corr_list)-len(new_vars)))
+    if len(new_vars) == 0:
+        new_scores = []
+    elif mi_method == 'histogram':
+        new_scores = find_histogram_mutual_info(df, new_vars, df_target, modeltype != 'Regression')
+    elif mi_method == 'knn_sample':
+        new_scores = find_sampled_knn_mutual_info(df, new_vars, df_target, sel_function)
+    elif per_column:
+        ### each var is scored on its own: worker processes share the columns as memory-maps ###
+        new_scores = find_results_in_shards(find_mutual_info_of_columns,
+                        [df[each_corr].values for each_corr in new_vars], n_jobs,
+                        np.asarray(df_target.values).ravel(), sel_function)
+    else:
+        new_scores = sel_function(df[new_vars], df_target, n_neighbors=5, discrete_features=False,
+                        random_state=42)
+    var_keys = dict(zip(corr_list, cache_keys))
+    scores = dict(zip(cache_keys, [mutual_info_cache.get(key) for key in cache_keys]))
+    for each_corr, score in zip(new_vars, new_scores):
+        scores[var_keys[each_corr]] = score
+        mutual_info_cache[var_keys[each_corr]] = score
+    ### dicts keep insertion order: so the scores that were cached first are removed first ###
+    if len(mutual_info_cache) > max_mutual_info_cache:
+        for key in list(mutual_info_cache)[:len(mutual_info_cache)-max_mutual_info_cache]:
+            del mutual_info_cache[key]
+    return [scores[key] for key in cache_keys]
+##################################################################################
+def remove_highly_correlated_vars_fast(df, corr_limit=0.70, n_jobs=None):
+    """
+    This is a simple method to remove highly correlated features fast using Pearson's Correlation.
+    Use this only for float and integer variables. It will automatically select those only.
+    It can be used for very large data sets where featurewiz has trouble with memory
+    If the numeric variables have no missing values, the correlations are found with matrix
+    multiplies (using n_jobs BLAS threads) without building the full correlation matrix.
+    Otherwise df.corr() is used since it skips missing values pair by pair.
+    """
+    numvars = df.select_dtypes(include=['number','bool']).columns.tolist()
+    if df[numvars].isnull().values.any():
+        # Creating correlation matrix
+        correlation_dataframe = df[numvars].corr().abs().astype(np.float16)
+        # Selecting upper triangle of correlation matrix
+        upper_tri = correlation_dataframe.where(np.triu(np.ones(correlation_dataframe.shape),
+                                      k=1).astype(bool))
+        # Finding index of feature columns with correlation greater than 0.95
+        to_drop = [column for column in upper_tri.columns if any(upper_tri[column] > corr_limit)]
+    else:
+        ### the second var of each pair is the one in the upper triangle of the correlation matrix ###
+        corrdf = find_correlated_pairs_in_blocks(df, numvars, corr_limit, n_jobs=n_jobs)
+        correlated_vars = set(corrdf.loc[corrdf['coeff'] > corr_limit, 'var2'])
+        to_drop = [column for column in numvars if column in correlated_vars]
+    print();
+    print('Highly correlated columns to remove: %s' %to_drop)
+    return to_drop
 ##################################################################################
 def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
-                                corr_limit = 0.70,verbose=0, dask_xgboost_flag=False):
+                                corr_limit = 0.70,verbose=0, dask_xgboost_flag=False,
+                                scratch_dir=None, n_jobs=None, mi_method='knn', corr_pairs=None):
     """
     FE stands for Feature Engineering - it means this function performs feature engineering
     ###########################################################################################
@@ -73,45 +547,50 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
     that it is correlated to. Then we select next var. This way we knock out correlated variables.
     Finally we are left with uncorrelated variables that are also highly important in mutual score.
     ########  YOU MUST INCLUDE THE ABOVE MESSAGE IF YOU COPY THIS CODE IN YOUR LIBRARY ##########
+    If scratch_dir is given, numvars are spilled to a memory-mapped file in that directory and
+    correlations and mutual information are found by reading from that file instead of RAM.
+    n_jobs is the number of BLAS threads used for the correlations and the number of worker processes
+    that find the KNN mutual info scores. -1 means all the cpu's. None (default) leaves BLAS with
+    its default number of threads and finds the scores in this process. With more than one worker,
+    each var is scored on its own (as with scratch_dir) instead of all vars in one call.
+    Mutual info scores are cached by the hashes of the values of each var and the target. So
+    running SULOV again on the same data (say with another corr_limit) does not find them again.
+    mi_method picks the estimator of the mutual information scores that rank the correlated vars:
+        'knn' (default): sklearn's KNN estimator on all rows. This is the most accurate and slowest.
+        'histogram': binned estimate on quantile bins of all rows. This is the fastest on millions of rows.
+        'knn_sample': KNN estimator on random samples of rows that are doubled until the ranks of
+            the vars on two samples agree.
+    corr_pairs: default is None. The correlated pairs (var1, var2, coeff) above corr_limit if they
+        were found already, say by find_correlated_pairs_from_chunks on all the rows of data
+        while df is only a sample of them. Then only the mutual info scores are found from df.
     """
-    df = copy.deepcopy(df)
+    if mi_method not in ['knn', 'histogram', 'knn_sample']:
+        print('    mi_method must be one of knn, histogram or knn_sample. Using knn...')
+        mi_method = 'knn'
     df_target = df[target]
-    df = df[numvars]
-    ### for some reason, doing a mass fillna of vars doesn't work! Hence doing it individually!
-    null_vars = np.array(numvars)[df.isnull().sum()>0]
-    for each_num in null_vars:
-        df[each_num] = df[each_num].fillna(0)
+    df, X_working_set = create_numeric_frame(df, numvars, scratch_dir)
     target = copy.deepcopy(target)
 
     print('#######################################################################################')
     print('#####  Searching for Uncorrelated List Of Variables (SULOV) in %s features ############' %len(numvars))
     print('#######################################################################################')
-    ### This is a shorter version of getting unduplicated and highly correlated vars ##
-    #correlation_dataframe = df.corr().abs().unstack().sort_values().drop_duplicates()
-    ### This change was suggested by such3r on GitHub issues. Added Dec 30, 2022 ###
-    correlation_dataframe = df.corr().abs().unstack().sort_values().round(7).drop_duplicates()
-    corrdf = pd.DataFrame(correlation_dataframe[:].reset_index())
-    corrdf.columns = ['var1','var2','coeff']
-    corrdf1 = corrdf[corrdf['coeff']>=corr_limit]
-    ### Make sure that the same var is not correlated to itself! ###
-    corrdf1 = corrdf1[corrdf1['var1'] != corrdf1['var2']]
-    correlated_pair = list(zip(corrdf1['var1'].values.tolist(),corrdf1['var2'].values.tolist()))
-    corr_pair_dict = dict(return_dictionary_list(correlated_pair))
-    corr_list = find_remove_duplicates(corrdf1['var1'].values.tolist()+corrdf1['var2'].values.tolist())
-    keys_in_dict = list(corr_pair_dict.keys())
-    reverse_correlated_pair = [(y,x) for (x,y) in correlated_pair]
-    reverse_corr_pair_dict = dict(return_dictionary_list(reverse_correlated_pair))
-    #### corr_pair_dict is used later to make the network diagram to see which vars are correlated to which
-    for key, val in reverse_corr_pair_dict.items():
-        if key in keys_in_dict:
-            if len(key) > 1:
-                corr_pair_dict[key] += val
+    ### Only the pairs above corr_limit are found: the full correlation matrix is never built ##
+    try:
+        if corr_pairs is None:
+            corrdf1 = find_correlated_pairs_in_blocks(df, numvars, corr_limit, scratch_dir=scratch_dir,
+                                              n_jobs=n_jobs)
         else:
-            corr_pair_dict[key] = val
-    
+            corrdf1 = corr_pairs
+        #### The correlated pairs are held as a graph in CSR arrays: the knockout below walks it ####
+        corr_list, indptr, indices = find_correlation_graph(corrdf1['var1'].values.tolist(),
+                                                        corrdf1['var2'].values.tolist())
+    except:
+        ### the scratch file must not outlive an error in the pair search ###
+        delete_numeric_working_set(X_working_set)
+        raise
     ###### This is for ordering the variables in the highest to lowest importance to target ###
     if len(corr_list) == 0:
-        final_list = list(correlation_dataframe)
+        delete_numeric_working_set(X_working_set)
         print('Selecting all (%d) variables since none of numeric vars are highly correlated...' %len(numvars))
         return numvars
     else:
@@ -125,13 +604,14 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
             sel_function = mutual_info_classif
             #fs = SelectKBest(score_func=sel_function, k=max_feats)
         ##### you must ensure there are no infinite nor null values in corr_list df ##
-        df_fit = df[corr_list]
-        ### Now check if there are any NaN values in the dataset #####
-        
-        if df_fit.isnull().sum().sum() > 0:
-            df_fit = df_fit.dropna()
-        else:
-            print('    there are no null values in dataset...')
+        if X_working_set is None:
+            df_fit = df[corr_list]
+            ### Now check if there are any NaN values in the dataset #####
+            
+            if df_fit.isnull().sum().sum() > 0:
+                df_fit = df_fit.dropna()
+            else:
+                print('    there are no null values in dataset...')
         ##### Reduce memory usage and find mutual information score ####       
         #try:
         #    df_fit = reduce_mem_usage(df_fit)
@@ -141,13 +621,14 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
         
         try:
             #fs.fit(df_fit, df_target)
-            if modeltype == 'Regression':
-                fs = mutual_info_regression(df_fit, df_target, n_neighbors=5, discrete_features=False, random_state=42)
-            else:
-                fs = mutual_info_classif(df_fit, df_target, n_neighbors=5, discrete_features=False, random_state=42)
+            fs = find_mutual_info_scores(df if X_working_set is not None else df_fit, corr_list,
+                                df_target, modeltype, mi_method=mi_method, n_jobs=n_jobs,
+                                per_column=X_working_set is not None)
         except:
+            delete_numeric_working_set(X_working_set)
             print('    SelectKBest() function is erroring. Returning with all %s variables...' %len(numvars))
             return numvars
+        delete_numeric_working_set(X_working_set)
         try:
             #################################################################################
             #######   This is the main section where we use mutual info score to select vars        
@@ -157,19 +638,9 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
             #### The first variable in list has the highest correlation to the target variable ###
             sorted_by_mutual_info =[key for (key,val) in sorted(mutual_info.items(), key=lambda kv: kv[1],reverse=True)]
             #####   Now we select the final list of correlated variables ###########
-            selected_corr_list = []
-            #### You have to make multiple copies of this sorted list since it is iterated many times ####
             orig_sorted = copy.deepcopy(sorted_by_mutual_info)
-            copy_sorted = copy.deepcopy(sorted_by_mutual_info)
-            copy_pair = copy.deepcopy(corr_pair_dict)
-            #### select each variable by the highest mutual info and see what vars are correlated to it
-            for each_corr_name in copy_sorted:
-                ### add the selected var to the selected_corr_list
-                selected_corr_list.append(each_corr_name)
-                for each_remove in copy_pair[each_corr_name]:
-                    #### Now remove each variable that is highly correlated to the selected variable
-                    if each_remove in copy_sorted:
-                        copy_sorted.remove(each_remove)
+            #### select each variable by the highest mutual info and knock out vars correlated to it
+            selected_corr_list = select_vars_by_knockout(sorted_by_mutual_info, corr_list, indptr, indices)
             ##### Now we combine the uncorrelated list to the selected correlated list above
             rem_col_list = left_subtract(numvars,corr_list)
             final_list = rem_col_list + selected_corr_list
@@ -177,7 +648,7 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
         except Exception as e:
             print('    SULOV Method crashing due to %s' %e)
             #### Dropping highly correlated Features fast using simple linear correlation ###
-            removed_cols = remove_highly_correlated_vars_fast(df,corr_limit)
+            removed_cols = remove_highly_correlated_vars_fast(df,corr_limit, n_jobs=n_jobs)
             final_list = left_subtract(numvars, removed_cols)
         if len(removed_cols) > 0:
             print('    Removing (%d) highly correlated variables:' %(len(removed_cols)))
@@ -199,17 +670,11 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
                 ######### This is where you calculate the size of each node to draw
                 sizes = [mutual_info[x]*multiplier for x in list(gf.nodes())]
                 ####  The sizes of the bubbles for each node is determined by its mutual information score value
-                corr = df_fit.corr()
-                high_corr = corr[abs(corr)>corr_limit]
-                ## high_corr is the dataframe of a few variables that are highly correlated to each other
-                combos = combinations(corr_list,2)
+                ## corrdf1 has the few pairs of variables that are highly correlated to each other
                 ### this gives the strength of correlation between 2 nodes ##
                 multiplier = 20
-                for (var1, var2) in combos:
-                    if np.isnan(high_corr.loc[var1,var2]):
-                        pass
-                    else:
-                        gf.add_edge(var1, var2,weight=multiplier*high_corr.loc[var1,var2])
+                for (var1, var2, coeff) in corrdf1[['var1','var2','coeff']].values:
+                    gf.add_edge(var1, var2,weight=multiplier*coeff)
                 ######## Now start building the networkx graph ##########################
                 widths = nx.get_edge_attributes(gf, 'weight')
                 nodelist = gf.nodes()
@@ -261,3 +726,59 @@ def FE_remove_variables_using_SULOV_method(df, numvars, modeltype, target,
             print('Completed SULOV. %d features selected' %len(final_list))
         return final_list
 ###################################################################################
+def FE_remove_variables_using_SULOV_method_for_corr_limits(df, numvars, modeltype, target,
+                                corr_limits=[0.70, 0.80, 0.90, 0.95], verbose=0,
+                                scratch_dir=None, n_jobs=None, mi_method='knn'):
+    """
+    Runs SULOV for several values of corr_limit in one pass. This is for tuning corr_limit.
+    The correlated pairs are found once at the lowest corr_limit and the mutual info scores of
+    the vars in those pairs are found once. For each corr_limit, only the pairs at or above it
+    are kept and the knockout rounds of SULOV are run on them. Those rounds are cheap.
+    Inputs are the same as FE_remove_variables_using_SULOV_method except corr_limits is a list.
+    Outputs a dictionary of each corr_limit and the list of vars that SULOV selects for it.
+    Since all scores are found in one call, they can differ slightly from those of a separate
+    SULOV run with mi_method='knn' on one process (sklearn's KNN estimator adds noise by column).
+    """
+    corr_limits = sorted(set(corr_limits))
+    if mi_method not in ['knn', 'histogram', 'knn_sample']:
+        print('    mi_method must be one of knn, histogram or knn_sample. Using knn...')
+        mi_method = 'knn'
+    df_target = df[target]
+    df, X_working_set = create_numeric_frame(df, numvars, scratch_dir)
+    print('#######################################################################################')
+    print('#####  Searching for Uncorrelated List Of Variables (SULOV) in %s features for %d corr_limits' %(
+                                len(numvars), len(corr_limits)))
+    print('#######################################################################################')
+    ### the pairs above each higher corr_limit are a subset of the pairs above the lowest one ###
+    try:
+        corrdf1 = find_correlated_pairs_in_blocks(df, numvars, corr_limits[0], scratch_dir=scratch_dir,
+                                              n_jobs=n_jobs)
+        all_corr_list, _, _ = find_correlation_graph(corrdf1['var1'].values.tolist(),
+                                                 corrdf1['var2'].values.tolist())
+    except:
+        delete_numeric_working_set(X_working_set)
+        raise
+    try:
+        fs = find_mutual_info_scores(df, all_corr_list, df_target, modeltype, mi_method=mi_method,
+                            n_jobs=n_jobs, per_column=X_working_set is not None)
+    except:
+        delete_numeric_working_set(X_working_set)
+        print('    SelectKBest() function is erroring. Returning with all %s variables...' %len(numvars))
+        return dict([(corr_limit, numvars) for corr_limit in corr_limits])
+    delete_numeric_working_set(X_working_set)
+    mutual_info = dict(zip(all_corr_list, fs))
+    results = {}
+    for corr_limit in corr_limits:
+        corrdf = corrdf1[corrdf1['coeff'] >= corr_limit]
+        corr_list, indptr, indices = find_correlation_graph(corrdf['var1'].values.tolist(),
+                                                            corrdf['var2'].values.tolist())
+        sorted_by_mutual_info = sorted(corr_list, key=lambda var: mutual_info[var], reverse=True)
+        selected_corr_list = select_vars_by_knockout(sorted_by_mutual_info, corr_list, indptr, indices)
+        results[corr_limit] = left_subtract(numvars, corr_list) + selected_corr_list
+        if verbose:
+            print('    corr_limit %s: %d vars selected. Removed %s' %(corr_limit,
+                        len(results[corr_limit]), left_subtract(numvars, results[corr_limit])))
+        else:
+            print('    corr_limit %s: %d vars selected' %(corr_limit, len(results[corr_limit])))
+    return results
+###################################################################################
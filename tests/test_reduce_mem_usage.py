@@ -0,0 +1,18 @@
+import sys
+import numpy as np
+import pandas as pd
+import featurewiz
+fw = sys.modules['featurewiz.featurewiz']
+
+
+def test_nullable_columns_are_left_out_of_dtype_plan():
+    df = pd.DataFrame({'a': pd.array([1, 2, None], dtype='Int64'),
+                       'b': pd.array([1.5, None, 2.0], dtype='Float64'),
+                       'c': [1, 2, 3], 'd': [1.0, 2.0, 3.0]})
+    out, plan = fw.reduce_mem_usage(df, return_plan=True, verbose=1)
+    assert set(plan) == {'c', 'd'}
+    assert out['a'].dtype == 'Int64' and out['b'].dtype == 'Float64'
+    assert out['c'].dtype == np.int8 and out['d'].dtype == np.float32
+    #### a plan from train data must also apply to test data with nullable columns ####
+    test = fw.apply_dtype_plan(df, {'a': np.dtype(np.int8), 'c': np.dtype(np.int8)})
+    assert test['a'].dtype == 'Int64' and test['c'].dtype == np.int8
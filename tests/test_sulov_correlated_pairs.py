@@ -0,0 +1,34 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+import featurewiz
+sm = sys.modules['featurewiz.sulov_method']
+
+
+def make_densely_correlated_data(n_rows, n_cols, seed=0):
+    #### every column shares one factor so that every pair is above the corr_limit ####
+    rng = np.random.RandomState(seed)
+    X = rng.randn(n_rows, 1) + 0.3*rng.randn(n_rows, n_cols)
+    return pd.DataFrame(X, columns=['c%d' % i for i in range(n_cols)])
+
+
+def test_dense_pairs_match_corr_across_tiles():
+    df = make_densely_correlated_data(3000, 60)
+    corrdf = sm.find_correlated_pairs_in_blocks(df, list(df), 0.7, block_cols=25, block_rows=1000)
+    corr = df.corr().abs().values
+    expected = np.round(corr[np.triu_indices(df.shape[1], 1)], 7)
+    assert len(corrdf) == (expected >= 0.7).sum() == 60*59//2
+    positions = dict((col, i) for i, col in enumerate(df))
+    found = np.round([corr[positions[a], positions[b]] for a, b in zip(corrdf['var1'], corrdf['var2'])], 7)
+    np.testing.assert_array_equal(found, corrdf['coeff'].values)
+
+
+if __name__ == '__main__':
+    #### benchmark: python -m tests.test_sulov_correlated_pairs (from the top folder) ####
+    for n_cols in [1000, 2000]:
+        df = make_densely_correlated_data(5000, n_cols)
+        start = time.time()
+        corrdf = sm.find_correlated_pairs_in_blocks(df, list(df), 0.7)
+        print('%d rows x %d densely correlated columns: %d pairs in %.1f seconds' %(
+                df.shape[0], n_cols, len(corrdf), time.time()-start))
@@ -0,0 +1,43 @@
+import sys
+import numpy as np
+import xgboost as xgb
+import featurewiz
+fw = sys.modules['featurewiz.featurewiz']
+
+
+def test_permutation_uses_window_of_masked_round(monkeypatch):
+    rng = np.random.RandomState(0)
+    X = rng.randn(2000, 10).astype(np.float32)
+    y = X[:, 0] + X[:, 7] + 0.5*X[:, 8] + 0.1*rng.randn(2000)
+    names = ['f%d' % i for i in range(10)]
+    params = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'seed': 99}
+    #### a round of the masked path trains on all columns with the columns before start masked ####
+    start = 6
+    dtrain_all = fw.build_feature_selection_matrix(X, y, names, 'hist')
+    bst = xgb.train(fw.find_feature_window_params(dtrain_all, params, start), dtrain_all, num_boost_round=20)
+    assert len(bst.feature_names) == 10
+    fold_num_cols = []
+    train = xgb.train
+    def recording_train(round_params, dtrain, *args, **kwargs):
+        fold_num_cols.append(dtrain.num_col())
+        return train(round_params, dtrain, *args, **kwargs)
+    monkeypatch.setattr(fw.xgb, 'train', recording_train)
+    imp_feats = fw.find_xgboost_importances(bst, X, y, names, 'permutation', 'Regression',
+                                    params=params, num_rounds=20, start=start)
+    assert fold_num_cols == [4, 4]
+    assert set(imp_feats) <= set(names[start:])
+    assert imp_feats['f7'] > 0 and imp_feats['f8'] > 0
+    #### f0 is the strongest feature but it is outside the window ####
+    assert 'f0' not in imp_feats
+
+
+def test_shap_keeps_only_window_of_masked_round():
+    rng = np.random.RandomState(1)
+    X = rng.randn(1000, 8).astype(np.float32)
+    y = X[:, 0] + X[:, 5]
+    names = ['f%d' % i for i in range(8)]
+    dtrain_all = fw.build_feature_selection_matrix(X, y, names, 'hist')
+    params = fw.find_feature_window_params(dtrain_all, {'tree_method': 'hist', 'seed': 99}, 4)
+    bst = xgb.train(params, dtrain_all, num_boost_round=10)
+    imp_feats = fw.find_xgboost_importances(bst, X, y, names, 'shap', 'Regression', start=4)
+    assert set(imp_feats) <= set(names[4:]) and 'f5' in imp_feats